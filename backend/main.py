@@ -1,4 +1,5 @@
 # backend/main.py
+import asyncio
 from fastapi import FastAPI
 from routes import script
 from fastapi.middleware.cors import CORSMiddleware
@@ -6,6 +7,17 @@ from routes import voice
 from routes import image
 from routes import video
 from routes import combined_video
+from routes import uploads
+from routes import media
+from services.job_queue import combined_video_queue
+from services.http_clients import close_clients
+from services.heygen_poller import heygen_poller
+from services.gpt_service import completion_cache
+from services import image_caption
+from services.blob_store import blob_store
+from services.render_scheduler import render_scheduler
+from services.ffmpeg import probe_cache
+from services.image_store import image_store
 
 app = FastAPI()
 
@@ -15,15 +27,47 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let browsers read the metadata headers of streamed responses
+    expose_headers=["X-Session-Id", "X-Voice-Text"],
 )
 app.include_router(script.router)
 
+@app.on_event("startup")
+async def start_workers():
+    combined_video_queue.start()
+    if image_caption.CAPTION_WARMUP:
+        asyncio.create_task(image_caption.warm_up())
+
+@app.on_event("shutdown")
+async def stop_workers():
+    await combined_video_queue.stop()
+    await heygen_poller.stop()
+    await image_caption.caption_batcher.stop()
+    image_store.stop()
+    await close_clients()
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+@app.get("/metrics")
+def metrics():
+    return {
+        "combined_video_jobs": combined_video_queue.stats(),
+        "heygen_poller": heygen_poller.stats(),
+        "completion_cache": completion_cache.stats(),
+        "caption_cache": image_caption.caption_cache.stats(),
+        "caption_batcher": image_caption.caption_batcher.stats(),
+        "blob_store": blob_store.stats(),
+        "render_scheduler": render_scheduler.stats(),
+        "probe_cache": probe_cache.stats(),
+        "image_store": image_store.stats()
+    }
+
 
 app.include_router(voice.router)
 app.include_router(image.router)
 app.include_router(video.router)
-app.include_router(combined_video.router)
\ No newline at end of file
+app.include_router(combined_video.router)
+app.include_router(uploads.router)
+app.include_router(media.router)
\ No newline at end of file
@@ -1,17 +1,25 @@
-from fastapi import APIRouter, Body, HTTPException, Form, UploadFile, File
+from fastapi import APIRouter, Body, HTTPException, Form, Request, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Any, Awaitable, Dict, Optional, List, Tuple
+import asyncio
 import os
+import time
 import uuid
-import httpx
+from services.blob_store import blob_store
+from services.downloads import download_to_file
 from services.veo_service import VeoService
 from services.heygen_service import HeyGenService
-from services.ffmpeg import FFmpegService
+from services.ffmpeg import DEFAULT_RENDER_PROFILE, HLS_PLAYLIST, LAYOUT_PRESETS, RENDER_PROFILES, FFmpegService
+from services.job_queue import Job, QueueFullError, combined_video_queue
+from services.media import MediaFileResponse, media_url
+from services.session_store import session_store
 
 router = APIRouter()
 
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Asset kinds reported with probed media info by the status endpoint
+MEDIA_KINDS = {"video", "voice", "voiceover", "veo_background", "heygen_overlay", "combined_preview", "combined_final", "combined_layout"}
 
 class CombinedVideoRequest(BaseModel):
     veo_prompt: str
@@ -24,81 +32,300 @@ class CombinedVideoRequest(BaseModel):
     overlay_position: Optional[str] = "center"
     overlay_size: Optional[List[int]] = None
     background_audio: Optional[bool] = True
+    render_profile: Optional[str] = DEFAULT_RENDER_PROFILE
+    output_layouts: Optional[List[str]] = None
+    stream_output: Optional[bool] = False
+    async_job: Optional[bool] = False
 
-@router.post("/combined-video/generate")
-async def generate_combined_video(request: CombinedVideoRequest):
+async def _run_concurrently(stages: Dict[str, Awaitable], timings: Dict[str, float]) -> Dict[str, Any]:
     """
-    Generate a combined video using Veo 3 for background and HeyGen for overlay.
+    Run named stages in parallel and return their results by name.
+    If any stage fails the others are cancelled and the first error is raised.
+    Each stage's wall-clock seconds are recorded in timings.
     """
-    session_id = str(uuid.uuid4())
-    
+    async def timed(name: str, stage: Awaitable):
+        stage_started = time.monotonic()
+        try:
+            return await stage
+        finally:
+            timings[name] = round(time.monotonic() - stage_started, 3)
+
+    tasks = {name: asyncio.create_task(timed(name, stage)) for name, stage in stages.items()}
     try:
-        # Step 1: Generate Veo background video
+        done, pending = await asyncio.wait(tasks.values(), return_when=asyncio.FIRST_EXCEPTION)
+    except asyncio.CancelledError:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+
+    failed = next((task for task in done if task.exception() is not None), None)
+    if failed is not None:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        raise failed.exception()
+
+    return {name: task.result() for name, task in tasks.items()}
+
+async def _run_combined_pipeline(
+    session_id: str,
+    veo_prompt: str,
+    script: str,
+    avatar_id: str,
+    voice_id: str,
+    veo_duration: int,
+    veo_aspect_ratio: str,
+    veo_quality: str,
+    overlay_position: str,
+    overlay_size: Optional[Tuple[int, int]],
+    background_audio: bool,
+    render_profile: str = DEFAULT_RENDER_PROFILE,
+    output_layouts: Optional[List[str]] = None,
+    stream_output: bool = False,
+    job: Optional[Job] = None
+) -> dict:
+    """
+    Run the Veo -> HeyGen -> FFmpeg pipeline and return the combined video result.
+    Progress is reported on job when the pipeline runs in the background.
+    """
+    def set_stage(stage: str):
+        if job:
+            job.set_stage(stage)
+
+    async def add_artifact(name: str, kind: str, path: str, sha256: Optional[str] = None):
+        sha256 = await run_in_threadpool(blob_store.adopt, path, sha256)
+        session_store.add_asset(session_id, kind, path, sha256=sha256)
+        if job:
+            job.add_artifact(name, path)
+
+    session_store.create_session(session_id)
+    timings = {}
+    downloads = {}
+    started = time.monotonic()
+
+    async def veo_stage():
+        # Generate and save the Veo background video
+        veo_path = session_store.asset_path(session_id, "veo_background.mp4")
         veo_service = VeoService()
-        veo_result = veo_service.generate_video(
-            prompt=request.veo_prompt,
-            duration=request.veo_duration,
-            aspect_ratio=request.veo_aspect_ratio,
-            quality=request.veo_quality
+        veo_result = await veo_service.generate_video(
+            prompt=veo_prompt,
+            output_path=veo_path,
+            duration=veo_duration,
+            aspect_ratio=veo_aspect_ratio,
+            quality=veo_quality
         )
-        
-        # Save Veo video
-        veo_path = os.path.join(UPLOAD_DIR, f"{session_id}_veo_background.mp4")
-        with open(veo_path, "wb") as f:
-            f.write(veo_result["video_data"])
-        
-        # Step 2: Generate HeyGen overlay video
+        await add_artifact("veo_video", "veo_background", veo_path)
+        return veo_result, veo_path
+
+    async def heygen_stage():
+        # Generate and download the HeyGen overlay video
         heygen_service = HeyGenService()
-        heygen_result = heygen_service.create_talking_avatar_video(
-            script=request.heygen_script,
-            avatar_id=request.avatar_id,
-            voice_id=request.voice_id
+        heygen_result = await heygen_service.create_talking_avatar_video(
+            script=script,
+            avatar_id=avatar_id,
+            voice_id=voice_id
         )
-        
-        # Download HeyGen video
-        heygen_path = os.path.join(UPLOAD_DIR, f"{session_id}_heygen_overlay.mp4")
-        async with httpx.AsyncClient() as client:
-            response = await client.get(heygen_result["video_url"])
-            response.raise_for_status()
-            with open(heygen_path, "wb") as f:
-                f.write(response.content)
-        
-        # Step 3: Overlay videos using FFmpeg
-        output_path = os.path.join(UPLOAD_DIR, f"{session_id}_combined_final.mp4")
-        
-        overlay_size = None
-        if request.overlay_size and len(request.overlay_size) == 2:
-            overlay_size = tuple(request.overlay_size)
-        
-        success = FFmpegService.overlay_videos(
+
+        heygen_path = session_store.asset_path(session_id, "heygen_overlay.mp4")
+        download = await download_to_file(heygen_result["video_url"], heygen_path)
+        downloads["heygen"] = download
+        if job:
+            job.record_metric("heygen_download", download)
+        await add_artifact("heygen_video", "heygen_overlay", heygen_path, download["sha256"])
+        return heygen_result, heygen_path
+
+    # Steps 1 and 2: Veo and HeyGen do not depend on each other, so run them together
+    set_stage("veo+heygen")
+    results = await _run_concurrently({"veo": veo_stage(), "heygen": heygen_stage()}, timings)
+    veo_result, veo_path = results["veo"]
+    heygen_result, heygen_path = results["heygen"]
+
+    # Step 3: For background jobs, a short low-resolution preview first, so the client
+    # has something to play within seconds; it is not fatal if it fails. A synchronous
+    # caller only sees the final video, so there the preview would just delay it.
+    preview_path = None
+    if job is not None:
+        set_stage("preview")
+        preview_started = time.monotonic()
+        preview_path = session_store.asset_path(session_id, "combined_preview.mp4")
+        if await FFmpegService.render_preview(
+            background_video_path=veo_path,
+            overlay_video_path=heygen_path,
+            output_path=preview_path,
+            overlay_position=overlay_position,
+            overlay_size=overlay_size,
+            background_audio=background_audio
+        ):
+            await add_artifact("preview_video", "combined_preview", preview_path)
+            job.set_preview(preview_path)
+        else:
+            preview_path = None
+        timings["preview"] = round(time.monotonic() - preview_started, 3)
+
+    # Step 4: Overlay videos using FFmpeg
+    set_stage("overlay")
+    overlay_started = time.monotonic()
+    output_path = session_store.asset_path(session_id, "combined_final.mp4")
+    layout_paths = {
+        name: session_store.asset_path(session_id, f"combined_{name.replace(':', 'x')}.mp4")
+        for name in output_layouts or []
+    }
+    # With stream_output the main render is also written as HLS, playable while it encodes
+    hls_dir = os.path.join(session_store.session_dir(session_id), "hls") if stream_output else None
+    if hls_dir and job:
+        job.add_artifact("hls_playlist", os.path.join(hls_dir, HLS_PLAYLIST))
+
+    if layout_paths:
+        # The requested formats are rendered alongside the main composite from a single decode
+        success = await FFmpegService.render_layouts(
+            background_video_path=veo_path,
+            overlay_video_path=heygen_path,
+            outputs=[{
+                "path": output_path,
+                "overlay_position": overlay_position,
+                "overlay_size": overlay_size,
+                "hls_dir": hls_dir
+            }] + [
+                {**LAYOUT_PRESETS[name], "path": path} for name, path in layout_paths.items()
+            ],
+            background_audio=background_audio,
+            profile=render_profile
+        )
+    else:
+        success = await FFmpegService.overlay_videos(
             background_video_path=veo_path,
             overlay_video_path=heygen_path,
             output_path=output_path,
-            overlay_position=request.overlay_position,
+            overlay_position=overlay_position,
             overlay_size=overlay_size,
-            background_audio=request.background_audio
+            background_audio=background_audio,
+            profile=render_profile,
+            hls_dir=hls_dir
         )
-        
-        if not success:
-            raise HTTPException(status_code=500, detail="Video overlay failed")
-        
-        return {
-            "session_id": session_id,
-            "status": "completed",
-            "veo_video": veo_path,
-            "heygen_video": heygen_path,
-            "combined_video": output_path,
-            "veo_result": {
-                "duration": veo_result["duration"],
-                "aspect_ratio": veo_result["aspect_ratio"],
-                "quality": veo_result["quality"]
-            },
-            "heygen_result": {
-                "video_id": heygen_result["video_id"],
-                "duration": heygen_result["duration"]
-            }
-        }
-        
+
+    timings["overlay"] = round(time.monotonic() - overlay_started, 3)
+
+    if not success:
+        raise Exception("Video overlay failed")
+    timings["total"] = round(time.monotonic() - started, 3)
+    await add_artifact("combined_video", "combined_final", output_path)
+    for name, path in layout_paths.items():
+        await add_artifact(f"combined_video_{name}", "combined_layout", path)
+    set_stage("completed")
+
+    return {
+        "session_id": session_id,
+        "status": "completed",
+        "veo_video": veo_path,
+        "heygen_video": heygen_path,
+        "combined_video": output_path,
+        "preview_video": preview_path,
+        "urls": {
+            name: media_url(session_id, path)
+            for name, path in [
+                ("veo_video", veo_path),
+                ("heygen_video", heygen_path),
+                ("combined_video", output_path),
+                ("preview_video", preview_path),
+                *layout_paths.items()
+            ]
+            if path
+        },
+        "stream_url": _hls_url(session_id) if hls_dir else None,
+        "veo_result": {
+            "duration": veo_result["duration"],
+            "aspect_ratio": veo_result["aspect_ratio"],
+            "quality": veo_result["quality"]
+        },
+        "heygen_result": {
+            "video_id": heygen_result["video_id"],
+            "duration": heygen_result["duration"]
+        },
+        "render_profile": render_profile,
+        "layouts": layout_paths,
+        "timings": timings,
+        "downloads": downloads
+    }
+
+def _hls_url(session_id: str) -> str:
+    return f"/media/{session_id}/hls/{HLS_PLAYLIST}"
+
+def _check_render_profile(render_profile: Optional[str]) -> str:
+    render_profile = render_profile or DEFAULT_RENDER_PROFILE
+    if render_profile not in RENDER_PROFILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"render_profile must be one of {', '.join(RENDER_PROFILES)}"
+        )
+    return render_profile
+
+def _check_output_layouts(output_layouts: Optional[List[str]]) -> List[str]:
+    layouts = []
+    for name in output_layouts or []:
+        name = name.strip()
+        if not name or name in layouts:
+            continue
+        if name not in LAYOUT_PRESETS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"output_layouts must be from {', '.join(LAYOUT_PRESETS)}"
+            )
+        layouts.append(name)
+    return layouts
+
+def _submit_combined_job(session_id: str, **pipeline_args) -> JSONResponse:
+    """Queue the pipeline on the background worker pool and answer 202 with the job ID."""
+    try:
+        job = combined_video_queue.submit(
+            session_id,
+            lambda job: _run_combined_pipeline(session_id, job=job, **pipeline_args)
+        )
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    return JSONResponse(status_code=202, content={
+        "job_id": job.job_id,
+        "session_id": session_id,
+        "status": job.status,
+        "status_url": f"/combined-video/status/{job.job_id}",
+        # Starts answering once the first segment is rendered
+        "stream_url": _hls_url(session_id) if pipeline_args.get("stream_output") else None
+    })
+
+@router.post("/combined-video/generate")
+async def generate_combined_video(request: CombinedVideoRequest):
+    """
+    Generate a combined video using Veo 3 for background and HeyGen for overlay.
+    Set async_job to get a 202 with a job ID instead of waiting for the render.
+    """
+    session_id = str(uuid.uuid4())
+
+    overlay_size = None
+    if request.overlay_size and len(request.overlay_size) == 2:
+        overlay_size = tuple(request.overlay_size)
+
+    pipeline_args = dict(
+        veo_prompt=request.veo_prompt,
+        script=request.heygen_script,
+        avatar_id=request.avatar_id,
+        voice_id=request.voice_id,
+        veo_duration=request.veo_duration,
+        veo_aspect_ratio=request.veo_aspect_ratio,
+        veo_quality=request.veo_quality,
+        overlay_position=request.overlay_position,
+        overlay_size=overlay_size,
+        background_audio=request.background_audio,
+        render_profile=_check_render_profile(request.render_profile),
+        output_layouts=_check_output_layouts(request.output_layouts),
+        stream_output=request.stream_output
+    )
+
+    if request.async_job:
+        return _submit_combined_job(session_id, **pipeline_args)
+
+    try:
+        return await _run_combined_pipeline(session_id, **pipeline_args)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -112,99 +339,104 @@ async def generate_combined_video_with_script(
     veo_aspect_ratio: Optional[str] = Form("16:9"),
     veo_quality: Optional[str] = Form("standard"),
     overlay_position: Optional[str] = Form("center"),
-    background_audio: Optional[bool] = Form(True)
+    background_audio: Optional[bool] = Form(True),
+    render_profile: Optional[str] = Form(DEFAULT_RENDER_PROFILE),
+    output_layouts: Optional[str] = Form(None),
+    stream_output: Optional[bool] = Form(False),
+    async_job: Optional[bool] = Form(False)
 ):
     """
     Generate combined video using form data (for file uploads).
+    output_layouts is a comma-separated list such as "9:16,1:1".
     """
     session_id = str(uuid.uuid4())
-    
+
+    pipeline_args = dict(
+        veo_prompt=veo_prompt,
+        script=script,
+        avatar_id=avatar_id,
+        voice_id=voice_id,
+        veo_duration=veo_duration,
+        veo_aspect_ratio=veo_aspect_ratio,
+        veo_quality=veo_quality,
+        overlay_position=overlay_position,
+        overlay_size=None,
+        background_audio=background_audio,
+        render_profile=_check_render_profile(render_profile),
+        output_layouts=_check_output_layouts(output_layouts.split(",") if output_layouts else None),
+        stream_output=stream_output
+    )
+
+    if async_job:
+        return _submit_combined_job(session_id, **pipeline_args)
+
     try:
-        # Step 1: Generate Veo background video
-        veo_service = VeoService()
-        veo_result = veo_service.generate_video(
-            prompt=veo_prompt,
-            duration=veo_duration,
-            aspect_ratio=veo_aspect_ratio,
-            quality=veo_quality
-        )
-        
-        # Save Veo video
-        veo_path = os.path.join(UPLOAD_DIR, f"{session_id}_veo_background.mp4")
-        with open(veo_path, "wb") as f:
-            f.write(veo_result["video_data"])
-        
-        # Step 2: Generate HeyGen overlay video
-        heygen_service = HeyGenService()
-        heygen_result = heygen_service.create_talking_avatar_video(
-            script=script,
-            avatar_id=avatar_id,
-            voice_id=voice_id
-        )
-        
-        # Download HeyGen video
-        heygen_path = os.path.join(UPLOAD_DIR, f"{session_id}_heygen_overlay.mp4")
-        async with httpx.AsyncClient() as client:
-            response = await client.get(heygen_result["video_url"])
-            response.raise_for_status()
-            with open(heygen_path, "wb") as f:
-                f.write(response.content)
-        
-        # Step 3: Overlay videos using FFmpeg
-        output_path = os.path.join(UPLOAD_DIR, f"{session_id}_combined_final.mp4")
-        
-        success = FFmpegService.overlay_videos(
-            background_video_path=veo_path,
-            overlay_video_path=heygen_path,
-            output_path=output_path,
-            overlay_position=overlay_position,
-            background_audio=background_audio
-        )
-        
-        if not success:
-            raise HTTPException(status_code=500, detail="Video overlay failed")
-        
-        return {
-            "session_id": session_id,
-            "status": "completed",
-            "veo_video": veo_path,
-            "heygen_video": heygen_path,
-            "combined_video": output_path,
-            "veo_result": {
-                "duration": veo_result["duration"],
-                "aspect_ratio": veo_result["aspect_ratio"],
-                "quality": veo_result["quality"]
-            },
-            "heygen_result": {
-                "video_id": heygen_result["video_id"],
-                "duration": heygen_result["duration"]
-            }
-        }
-        
+        return await _run_combined_pipeline(session_id, **pipeline_args)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/combined-video/cancel/{session_id}")
+async def cancel_combined_video(session_id: str):
+    """
+    Cancel a combined video job. Pending provider calls are abandoned and a
+    running FFmpeg render is killed.
+    """
+    if not combined_video_queue.cancel(session_id):
+        raise HTTPException(status_code=404, detail="No queued or running job for this session")
+    return {"session_id": session_id, "status": "cancelled"}
+
+@router.api_route("/combined-video/preview/{session_id}", methods=["GET", "HEAD"])
+async def get_combined_video_preview(session_id: str, request: Request):
+    """
+    Serve the preview render as soon as it exists, while the final render is
+    still running.
+    """
+    job = combined_video_queue.get(session_id)
+    preview_path = job.preview if job else None
+    if preview_path is None:
+        asset = session_store.get_asset(session_id, "combined_preview")
+        preview_path = asset["path"] if asset else None
+    if preview_path is None or not os.path.exists(preview_path):
+        raise HTTPException(status_code=404, detail="Preview not ready")
+    return MediaFileResponse(preview_path, request.headers, method=request.method)
+
 @router.get("/combined-video/status/{session_id}")
 async def get_combined_video_status(session_id: str):
     """
     Get the status and files for a combined video generation session.
+    Sessions submitted as jobs report their live job state.
     """
+    job = combined_video_queue.get(session_id)
+    if job:
+        return {"session_id": session_id, **job.to_dict()}
+
     try:
+        assets = session_store.get_assets(session_id)
         files = {}
-        for fname in os.listdir(UPLOAD_DIR):
-            if fname.startswith(session_id):
-                file_path = os.path.join(UPLOAD_DIR, fname)
-                files[fname] = {
-                    "path": file_path,
-                    "exists": os.path.exists(file_path),
-                    "size": os.path.getsize(file_path) if os.path.exists(file_path) else 0
-                }
-        
+        probes = []
+        for asset in assets:
+            exists = os.path.exists(asset["path"])
+            files[asset["name"]] = {
+                "path": asset["path"],
+                "kind": asset["kind"],
+                "exists": exists,
+                "size": os.path.getsize(asset["path"]) if exists else 0,
+                "url": media_url(session_id, asset["path"])
+            }
+            if exists and asset["kind"] in MEDIA_KINDS:
+                probes.append((asset["name"], FFmpegService.probe(asset["path"], asset["sha256"])))
+
+        # Media info comes from the shared probe cache, so polling this endpoint
+        # does not spawn ffprobe for files that have already been inspected
+        infos = await asyncio.gather(*(probe for _, probe in probes), return_exceptions=True)
+        for (name, _), info in zip(probes, infos):
+            files[name]["media"] = None if isinstance(info, Exception) else info
+
         return {
             "session_id": session_id,
             "files": files,
-            "status": "completed" if any("combined_final" in f for f in files.keys()) else "processing"
+            "status": "completed" if any(a["kind"] == "combined_final" for a in assets) else "processing"
         }
-        
+
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,7 +1,16 @@
-from fastapi import APIRouter, Body, HTTPException
+from fastapi import APIRouter, Body, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
-from services.sd_service import generate_image, generate_image_with_prompt_optimization
+from typing import List, Optional
+import json
+from services.image_store import ImageNotFoundError, image_store, image_urls
+from services.media import MediaFileResponse
+from services.sd_service import (
+    IMAGE_BATCH_MAX_VARIANTS,
+    generate_image,
+    generate_image_variants,
+    generate_image_with_prompt_optimization
+)
 
 router = APIRouter()
 
@@ -15,24 +24,83 @@ class OptimizedImageRequest(BaseModel):
     style: Optional[str] = "realistic"
     tone: Optional[str] = "professional"
     size: Optional[str] = "1024x1024"
+    fresh: Optional[bool] = False
+
+class ImageVariant(BaseModel):
+    style: Optional[str] = "realistic"
+    tone: Optional[str] = "professional"
+
+class ImageBatchRequest(BaseModel):
+    user_input: str
+    variants: List[ImageVariant]
+    size: Optional[str] = "1024x1024"
+    fresh: Optional[bool] = False
 
 @router.post("/image")
-def create_image(request: ImageRequest):
+async def create_image(request: ImageRequest):
     try:
-        image_url = generate_image(request.prompt, request.size, request.quality)
-        return {"image_url": image_url}
+        image_id = await generate_image(request.prompt, request.size, request.quality)
+        return {"image_id": image_id, **image_urls(image_id)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/image/optimized")
-def create_optimized_image(request: OptimizedImageRequest):
+async def create_optimized_image(request: OptimizedImageRequest):
     try:
-        result = generate_image_with_prompt_optimization(
+        result = await generate_image_with_prompt_optimization(
             request.user_input,
             request.style,
             request.tone,
-            request.size
+            request.size,
+            fresh=request.fresh
         )
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/image/batch")
+async def create_image_batch(request: ImageBatchRequest):
+    """
+    Generate one optimized image per style/tone variant, concurrently. The
+    response is NDJSON: one line per image in the order they finish, each with
+    its index in variants and either the image URLs or an error, then a
+    summary line.
+    """
+    if not 1 <= len(request.variants) <= IMAGE_BATCH_MAX_VARIANTS:
+        raise HTTPException(status_code=400, detail=f"variants must have 1 to {IMAGE_BATCH_MAX_VARIANTS} entries")
+
+    async def lines():
+        failed = 0
+        async for result in generate_image_variants(
+            request.user_input,
+            [variant.model_dump() for variant in request.variants],
+            request.size,
+            fresh=request.fresh
+        ):
+            failed += "error" in result
+            yield json.dumps(result) + "\n"
+        yield json.dumps({"done": True, "count": len(request.variants), "failed": failed}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+# Images never change under their content-derived ID
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+@router.api_route("/image/{image_id}", methods=["GET", "HEAD"])
+async def get_image(image_id: str, request: Request, variant: Optional[str] = None, format: Optional[str] = None):
+    """
+    Serve a generated image as binary. Without parameters the original PNG is
+    returned. variant (thumb, square, portrait, story, landscape) resizes it and
+    format (webp, avif, jpeg, png; default webp) re-encodes it. Derivatives are
+    rendered once and cached.
+    """
+    try:
+        if variant is None and format is None:
+            path = image_store.original_path(image_id)
+        else:
+            path = await image_store.derivative_path(image_id, variant, format or "webp")
+    except ImageNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return MediaFileResponse(path, request.headers, method=request.method, cache_control=IMMUTABLE)
@@ -0,0 +1,47 @@
+from fastapi import APIRouter, HTTPException, Request
+import os
+import re
+from services.ffmpeg import HLS_PLAYLIST
+from services.media import MediaFileResponse
+from services.session_store import session_store
+
+router = APIRouter()
+
+# Files the HLS muxer writes: the playlist, init.mp4 and segment_NNNNN.m4s
+HLS_FILE = re.compile(r"^[\w-]+\.(m3u8|m4s|mp4)$")
+
+@router.api_route("/media/{session_id}/{name}", methods=["GET", "HEAD"])
+async def get_media(session_id: str, name: str, request: Request):
+    """
+    Serve a session artifact by its file name (e.g. combined_final.mp4).
+    Supports Range requests for seeking and answers conditional requests with
+    304 when the file is unchanged. Only files registered in the session index
+    are served.
+    """
+    asset = session_store.get_asset_by_name(session_id, name)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Media not found")
+    try:
+        return MediaFileResponse(asset["path"], request.headers, method=request.method)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Media file is missing")
+
+@router.api_route("/media/{session_id}/hls/{name}", methods=["GET", "HEAD"])
+async def get_hls_media(session_id: str, name: str, request: Request):
+    """
+    Serve the HLS playlist and segments of a combined video, also while it is
+    still rendering. The playlist grows until the render ends, so it is never
+    cached; segments do not change once listed.
+    """
+    if not HLS_FILE.match(name) or session_store.get_session(session_id) is None:
+        raise HTTPException(status_code=404, detail="Media not found")
+    path = os.path.join(session_store.session_dir(session_id), "hls", name)
+    try:
+        return MediaFileResponse(
+            path,
+            request.headers,
+            method=request.method,
+            cache_control="no-cache" if name == HLS_PLAYLIST else None
+        )
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Not rendered yet")
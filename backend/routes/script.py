@@ -1,21 +1,31 @@
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
 from fastapi.responses import JSONResponse
 import uuid
-import os
 from typing import Optional, List
-from services.image_caption import get_image_caption
-from services.video_frame import extract_first_frame
-import openai
-from dotenv import load_dotenv
+from services.blob_store import blob_store
+from services.ffmpeg import DEFAULT_RENDER_PROFILE
+from services.image_caption import caption_image, describe_video
+from services.gpt_service import chat_completion
+from services.session_store import check_session_id, session_store
+from services.uploads import UploadTooLargeError, save_upload
+from fastapi.concurrency import run_in_threadpool
 import json
 
 router = APIRouter()
 
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
+async def _store_upload(session_id: str, kind: str, upload: UploadFile, name: str) -> dict:
+    """
+    Stream an upload into the session directory, deduplicate it against the
+    blob store and register it with its content hash.
+    """
+    path = session_store.asset_path(session_id, name)
+    try:
+        saved = await save_upload(upload, path, kind)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    await run_in_threadpool(blob_store.adopt, path, saved["sha256"])
+    session_store.add_asset(session_id, kind, path, original_name=upload.filename, sha256=saved["sha256"])
+    return saved
 
 @router.post("/script")
 async def generate_script(
@@ -25,24 +35,28 @@ async def generate_script(
     session_id: Optional[str] = Form(None),
     script_format: Optional[str] = Form(None),
     creative_strategy: Optional[str] = Form(None),
-    execution_style: Optional[str] = Form(None)
+    execution_style: Optional[str] = Form(None),
+    fresh: Optional[bool] = Form(False)
 ):
     if not prompt and not image and not video and not session_id:
         raise HTTPException(status_code=400, detail="At least one input (prompt, image, video, or session_id) is required.")
+    if session_id:
+        try:
+            check_session_id(session_id)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
-    loaded_image_path = None
-    loaded_video_path = None
+    loaded_image = None
+    loaded_video = None
     product_info = None
     # If session_id is provided, try to find assets and product info
     if session_id:
-        for fname in os.listdir(UPLOAD_DIR):
-            if fname.startswith(f"{session_id}_image_") and loaded_image_path is None:
-                loaded_image_path = os.path.join(UPLOAD_DIR, fname)
-            if fname.startswith(f"{session_id}_video_") and loaded_video_path is None:
-                loaded_video_path = os.path.join(UPLOAD_DIR, fname)
-            if fname == f"{session_id}_product.json":
-                with open(os.path.join(UPLOAD_DIR, fname), "r") as f:
-                    product_info = json.load(f)
+        session_images = session_store.get_assets(session_id, "image")
+        if session_images:
+            loaded_image = session_images[0]
+        loaded_video = session_store.get_asset(session_id, "video")
+        product_info = session_store.get_product_info(session_id)
+    asset_session_id = session_id or str(uuid.uuid4())
 
     saved_files = {}
     image_caption = None
@@ -50,53 +64,39 @@ async def generate_script(
 
     # Uploaded image overrides loaded image
     if image:
-        image_path = os.path.join(UPLOAD_DIR, f"{session_id or str(uuid.uuid4())}_image_{image.filename}")
-        with open(image_path, "wb") as f:
-            f.write(await image.read())
-        saved_files["image"] = image_path
-        try:
-            image_caption = get_image_caption(image_path)
-        except Exception:
-            image_caption = None
-    elif loaded_image_path:
-        saved_files["image"] = loaded_image_path
+        image_asset = await _store_upload(asset_session_id, "image", image, f"image_{image.filename}")
+    else:
+        image_asset = loaded_image
+    if image_asset:
+        saved_files["image"] = image_asset["path"]
         try:
-            image_caption = get_image_caption(loaded_image_path)
+            image_caption = await caption_image(image_asset["path"], content_hash=image_asset["sha256"])
         except Exception:
             image_caption = None
 
     # Uploaded video overrides loaded video
     if video:
-        video_path = os.path.join(UPLOAD_DIR, f"{session_id or str(uuid.uuid4())}_video_{video.filename}")
-        with open(video_path, "wb") as f:
-            f.write(await video.read())
-        saved_files["video"] = video_path
-        frame_path = os.path.join(UPLOAD_DIR, f"{session_id or str(uuid.uuid4())}_frame.jpg")
-        if extract_first_frame(video_path, frame_path):
-            try:
-                video_caption = get_image_caption(frame_path)
-            except Exception:
-                video_caption = None
-    elif loaded_video_path:
-        saved_files["video"] = loaded_video_path
-        frame_path = os.path.join(UPLOAD_DIR, f"{session_id}_frame.jpg")
-        if extract_first_frame(loaded_video_path, frame_path):
-            try:
-                video_caption = get_image_caption(frame_path)
-            except Exception:
-                video_caption = None
+        video_asset = await _store_upload(asset_session_id, "video", video, f"video_{video.filename}")
+    else:
+        video_asset = loaded_video
+    if video_asset:
+        saved_files["video"] = video_asset["path"]
+        try:
+            video_caption = await describe_video(video_asset["path"], content_hash=video_asset["sha256"])
+        except Exception:
+            video_caption = None
 
     image_files = []
     video_file = None
     voice_file = None
     if session_id:
-        for fname in os.listdir(UPLOAD_DIR):
-            if fname.startswith(f"{session_id}_image_"):
-                image_files.append(fname.split('_', 3)[-1])
-            if fname.startswith(f"{session_id}_video_") and video_file is None:
-                video_file = fname.split('_', 2)[-1]
-            if fname.startswith(f"{session_id}_voice_") and voice_file is None:
-                voice_file = fname.split('_', 2)[-1]
+        image_files = [asset["original_name"] for asset in session_store.get_assets(session_id, "image")]
+        session_video = session_store.get_asset(session_id, "video")
+        if session_video:
+            video_file = session_video["original_name"]
+        session_voice = session_store.get_asset(session_id, "voice")
+        if session_voice:
+            voice_file = session_voice["original_name"]
 
     gpt_prompt = "Write an ad script."
     if product_info:
@@ -115,7 +115,7 @@ async def generate_script(
     if image_caption:
         gpt_prompt += f" The product image shows: {image_caption}."
     if video_caption:
-        gpt_prompt += f" The video shows: {video_caption}."
+        gpt_prompt += f" Key moments in the video: {video_caption}."
     if script_format:
         gpt_prompt += f" Script format: {script_format}."
     if creative_strategy:
@@ -124,16 +124,16 @@ async def generate_script(
         gpt_prompt += f" Creative execution style: {execution_style}."
 
     try:
-        response = openai.chat.completions.create(
-            model="gpt-3.5-turbo",
+        script = await run_in_threadpool(
+            chat_completion,
             messages=[
                 {"role": "system", "content": "You are an expert ad copywriter."},
                 {"role": "user", "content": gpt_prompt}
             ],
             max_tokens=300,
             temperature=0.7,
+            fresh=fresh
         )
-        script = response.choices[0].message.content.strip()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"OpenAI error: {e}")
 
@@ -159,30 +159,22 @@ async def upload_product(
     session_id = str(uuid.uuid4())
     saved_files = {"images": [], "video": None, "voice": None}
 
+    # Save product info in the session index
+    product_info = {"name": name, "description": description}
+    session_store.create_session(session_id, product_info)
+
     if images:
         for idx, image in enumerate(images):
-            image_path = os.path.join(UPLOAD_DIR, f"{session_id}_image_{idx}_{image.filename}")
-            with open(image_path, "wb") as f:
-                f.write(await image.read())
-            saved_files["images"].append(image_path)
+            saved = await _store_upload(session_id, "image", image, f"image_{idx}_{image.filename}")
+            saved_files["images"].append(saved["path"])
 
     if video:
-        video_path = os.path.join(UPLOAD_DIR, f"{session_id}_video_{video.filename}")
-        with open(video_path, "wb") as f:
-            f.write(await video.read())
-        saved_files["video"] = video_path
+        saved = await _store_upload(session_id, "video", video, f"video_{video.filename}")
+        saved_files["video"] = saved["path"]
 
     if voice:
-        voice_path = os.path.join(UPLOAD_DIR, f"{session_id}_voice_{voice.filename}")
-        with open(voice_path, "wb") as f:
-            f.write(await voice.read())
-        saved_files["voice"] = voice_path
-
-    # Save product info as JSON
-    product_info = {"name": name, "description": description}
-    product_info_path = os.path.join(UPLOAD_DIR, f"{session_id}_product.json")
-    with open(product_info_path, "w") as f:
-        json.dump(product_info, f)
+        saved = await _store_upload(session_id, "voice", voice, f"voice_{voice.filename}")
+        saved_files["voice"] = saved["path"]
 
     return JSONResponse({
         "session_id": session_id,
@@ -197,7 +189,8 @@ async def generate_veo_prompt(
     product_description: Optional[str] = Form(None),
     creative_style: Optional[str] = Form("cinematic"),
     mood: Optional[str] = Form("professional"),
-    target_audience: Optional[str] = Form(None)
+    target_audience: Optional[str] = Form(None),
+    fresh: Optional[bool] = Form(False)
 ):
     """
     Generate a Veo 3 prompt for video generation based on script and product info.
@@ -224,16 +217,16 @@ Focus on:
 Keep the prompt under 200 words and make it highly visual and descriptive."""
 
     try:
-        response = openai.chat.completions.create(
-            model="gpt-3.5-turbo",
+        veo_prompt = await run_in_threadpool(
+            chat_completion,
             messages=[
                 {"role": "system", "content": "You are an expert video director and cinematographer who creates compelling visual prompts for AI video generation."},
                 {"role": "user", "content": gpt_prompt}
             ],
             max_tokens=300,
             temperature=0.8,
+            fresh=fresh
         )
-        veo_prompt = response.choices[0].message.content.strip()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"OpenAI error: {e}")
 
@@ -267,7 +260,10 @@ async def complete_workflow(
     background_audio: Optional[bool] = Form(True),
     creative_style: Optional[str] = Form("cinematic"),
     mood: Optional[str] = Form("professional"),
-    target_audience: Optional[str] = Form(None)
+    target_audience: Optional[str] = Form(None),
+    render_profile: Optional[str] = Form(DEFAULT_RENDER_PROFILE),
+    output_layouts: Optional[str] = Form(None),
+    fresh: Optional[bool] = Form(False)
 ):
     """
     Complete workflow: Generate script, Veo prompt, and combined video.
@@ -283,7 +279,8 @@ async def complete_workflow(
         session_id=session_id,
         script_format=script_format,
         creative_strategy=creative_strategy,
-        execution_style=execution_style
+        execution_style=execution_style,
+        fresh=fresh
     )
     
     script_data = script_response.body.decode('utf-8')
@@ -294,10 +291,7 @@ async def complete_workflow(
     # Get product info from session
     product_info = None
     if session_id:
-        product_info_path = os.path.join(UPLOAD_DIR, f"{session_id}_product.json")
-        if os.path.exists(product_info_path):
-            with open(product_info_path, "r") as f:
-                product_info = json.load(f)
+        product_info = session_store.get_product_info(session_id)
     
     # Step 2: Generate Veo prompt
     veo_prompt_response = await generate_veo_prompt(
@@ -306,7 +300,8 @@ async def complete_workflow(
         product_description=product_info.get("description") if product_info else None,
         creative_style=creative_style,
         mood=mood,
-        target_audience=target_audience
+        target_audience=target_audience,
+        fresh=fresh
     )
     
     veo_prompt_data = veo_prompt_response.body.decode('utf-8')
@@ -325,7 +320,11 @@ async def complete_workflow(
         veo_aspect_ratio=veo_aspect_ratio,
         veo_quality=veo_quality,
         overlay_position=overlay_position,
-        background_audio=background_audio
+        background_audio=background_audio,
+        render_profile=render_profile,
+        output_layouts=output_layouts,
+        stream_output=False,
+        async_job=False
     )
     
     return JSONResponse({
@@ -0,0 +1,125 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from typing import Optional
+import re
+import uuid
+from fastapi.concurrency import run_in_threadpool
+from services.blob_store import blob_store
+from services.session_store import check_session_id, session_store
+from services.uploads import (
+    MAX_UPLOAD_BYTES,
+    UploadOffsetError,
+    UploadRangeError,
+    UploadTooLargeError,
+    resumable_uploads
+)
+
+router = APIRouter()
+
+CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+|\*)$")
+
+class UploadInitRequest(BaseModel):
+    kind: str
+    filename: str
+    size: int
+    session_id: Optional[str] = None
+    sha256: Optional[str] = None
+
+def _progress(state: dict) -> dict:
+    return {
+        "upload_id": state["upload_id"],
+        "session_id": state["session_id"],
+        "kind": state["kind"],
+        "filename": state["filename"],
+        "size": state["size"],
+        "offset": state["offset"],
+        "complete": state["offset"] >= state["size"],
+        "chunk_url": f"/uploads/{state['upload_id']}"
+    }
+
+@router.post("/uploads", status_code=201)
+async def create_upload(request: UploadInitRequest):
+    """
+    Start a resumable upload. Send the file afterwards in one or more
+    PUT /uploads/{upload_id} requests with a Content-Range header.
+    """
+    if request.kind not in MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {', '.join(MAX_UPLOAD_BYTES)}")
+    if request.size <= 0:
+        raise HTTPException(status_code=400, detail="size must be positive")
+
+    session_id = request.session_id or str(uuid.uuid4())
+    try:
+        check_session_id(session_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        state = resumable_uploads.create(session_id, request.kind, request.filename, request.size, request.sha256)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    session_store.create_session(session_id)
+    return _progress(state)
+
+@router.get("/uploads/{upload_id}")
+async def get_upload(upload_id: str):
+    """Current offset of an upload; resume by sending the bytes from here."""
+    state = resumable_uploads.get(upload_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return JSONResponse(_progress(state), headers={"Upload-Offset": str(state["offset"])})
+
+@router.put("/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, request: Request):
+    """
+    Append a chunk. The Content-Range start must equal the current offset;
+    otherwise 409 is returned with the offset to resume from. The body must be
+    exactly as long as the range and the total must match the declared size,
+    or 400 is returned. The request body is streamed to disk, so chunk size
+    does not affect memory use.
+    """
+    match = CONTENT_RANGE.match(request.headers.get("content-range", ""))
+    if not match:
+        raise HTTPException(status_code=400, detail="Content-Range header 'bytes start-end/total' is required")
+    start, end = int(match.group(1)), int(match.group(2))
+    total = None if match.group(3) == "*" else int(match.group(3))
+
+    try:
+        state = await resumable_uploads.append(upload_id, start, end, total, request.stream())
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except UploadOffsetError as e:
+        return JSONResponse(
+            status_code=409,
+            content={"detail": str(e), "offset": e.offset},
+            headers={"Upload-Offset": str(e.offset)}
+        )
+    except UploadRangeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    if state["offset"] < state["size"]:
+        return JSONResponse(_progress(state), headers={"Upload-Offset": str(state["offset"])})
+
+    asset_path = session_store.asset_path(state["session_id"], f"{state['kind']}_{state['filename']}")
+    try:
+        saved = await run_in_threadpool(resumable_uploads.finish, upload_id, asset_path)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    await run_in_threadpool(blob_store.adopt, asset_path, saved["sha256"])
+    session_store.add_asset(
+        state["session_id"],
+        state["kind"],
+        asset_path,
+        original_name=state["filename"],
+        sha256=saved["sha256"]
+    )
+    return {**_progress(state), "path": asset_path, "sha256": saved["sha256"]}
+
+@router.delete("/uploads/{upload_id}")
+async def cancel_upload(upload_id: str):
+    if resumable_uploads.get(upload_id) is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    resumable_uploads.discard(upload_id)
+    return {"upload_id": upload_id, "status": "cancelled"}
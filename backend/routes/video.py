@@ -1,7 +1,11 @@
-from fastapi import APIRouter, Body, HTTPException
+from fastapi import APIRouter, Body, HTTPException, Request
 from pydantic import BaseModel
 from typing import Optional, List
 from services.heygen_service import HeyGenService, create_talking_avatar_video
+from services.heygen_poller import heygen_poller, HEYGEN_WEBHOOK_SECRET
+import hashlib
+import hmac
+import json
 
 router = APIRouter()
 
@@ -19,7 +23,7 @@ class VoiceListResponse(BaseModel):
     voices: List[dict]
 
 @router.post("/video/generate")
-def generate_talking_avatar_video(request: VideoGenerationRequest):
+async def generate_talking_avatar_video(request: VideoGenerationRequest):
     """
     Generate a talking avatar video using HeyGen API.
     """
@@ -30,7 +34,7 @@ def generate_talking_avatar_video(request: VideoGenerationRequest):
         raise HTTPException(status_code=400, detail="voice_id is required")
     
     try:
-        result = create_talking_avatar_video(
+        result = await create_talking_avatar_video(
             script=request.script,
             avatar_id=request.avatar_id,
             voice_id=request.voice_id
@@ -40,37 +44,78 @@ def generate_talking_avatar_video(request: VideoGenerationRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/video/avatars")
-def get_available_avatars():
+async def get_available_avatars():
     """
     Get list of available avatars from HeyGen.
     """
     try:
         service = HeyGenService()
-        avatars = service.get_available_avatars()
+        avatars = await service.get_available_avatars()
         return {"avatars": avatars}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/video/voices")
-def get_available_voices():
+async def get_available_voices():
     """
     Get list of available voices from HeyGen.
     """
     try:
         service = HeyGenService()
-        voices = service.get_available_voices()
+        voices = await service.get_available_voices()
         return {"voices": voices}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/video/status/{video_id}")
-def get_video_status(video_id: str):
+async def get_video_status(video_id: str):
     """
     Get the status of a video generation task.
     """
     try:
         service = HeyGenService()
-        status = service._poll_video_status(video_id, max_attempts=1)  # Just check once
+        status = await service.get_video_status(video_id)
         return status
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/video/webhook/heygen")
+async def heygen_webhook(request: Request):
+    """
+    Receive HeyGen render events and complete waiting requests without polling.
+    Only enabled when HEYGEN_WEBHOOK_SECRET is configured.
+    """
+    if not HEYGEN_WEBHOOK_SECRET:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    body = await request.body()
+    expected = hmac.new(HEYGEN_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    # Compared as bytes: compare_digest rejects str with non-ASCII characters
+    if not hmac.compare_digest(expected.encode(), request.headers.get("signature", "").encode()):
+        raise HTTPException(status_code=401, detail="Invalid webhook signature")
+
+    try:
+        event = json.loads(body)
+        event_type = event["event_type"]
+        event_data = event["event_data"]
+        video_id = event_data["video_id"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid webhook payload")
+
+    if event_type == "avatar_video.success":
+        matched = heygen_poller.complete(video_id, {
+            "video_id": video_id,
+            "status": "completed",
+            "video_url": event_data.get("url"),
+            "duration": event_data.get("duration"),
+            "thumbnail_url": event_data.get("thumbnail_url"),
+            "error": None
+        })
+    elif event_type == "avatar_video.fail":
+        matched = heygen_poller.fail(video_id, f"Video generation failed: {event_data.get('msg', 'Unknown error')}")
+    else:
+        matched = False
+
+    if matched:
+        heygen_poller.webhook_completions += 1
+    return {"received": True, "matched": matched}
@@ -1,43 +1,106 @@
 from fastapi import APIRouter, Body, HTTPException
-from services.tts_service import text_to_speech
-import openai
-import os
-from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from services.blob_store import blob_store
+from services.session_store import check_session_id, session_store
+from services.tts_service import stream_text_to_speech, text_to_speech
+from services.gpt_service import chat_completion
 import base64
+import hashlib
+import os
+import uuid
 from typing import Optional
-
-load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
+from urllib.parse import quote
 
 router = APIRouter()
 
-def script_to_voice_text(script: str) -> str:
+def script_to_voice_text(script: str, fresh: bool = False) -> str:
     prompt = (
         "Rewrite the following ad script as a natural, concise, and engaging spoken ad copy, "
         "removing all directions, cues, and non-dialogue elements. Only output the text that should be spoken aloud.\n\n" + script
     )
-    response = openai.chat.completions.create(
-        model="gpt-3.5-turbo",
+    return chat_completion(
         messages=[
             {"role": "system", "content": "You are an expert ad copywriter and voiceover script editor."},
             {"role": "user", "content": prompt}
         ],
         max_tokens=300,
         temperature=0.7,
+        fresh=fresh
     )
-    return response.choices[0].message.content.strip()
 
 @router.post("/voice")
-def generate_voice(
+async def generate_voice(
     script: str = Body(..., embed=True),
-    voice_id: Optional[str] = Body(None, embed=True)
+    voice_id: Optional[str] = Body(None, embed=True),
+    fresh: Optional[bool] = Body(False, embed=True)
 ):
     try:
-        voice_text = script_to_voice_text(script)
+        voice_text = await run_in_threadpool(script_to_voice_text, script, fresh)
         if not voice_text:
             raise ValueError("No voice text generated from script.")
-        audio_bytes = text_to_speech(voice_text, voice_id)
+        audio_bytes = await text_to_speech(voice_text, voice_id)
         audio_base64 = base64.b64encode(audio_bytes).decode('utf-8')
         return {"voice_text": voice_text, "audio_base64": audio_base64}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/voice/stream")
+async def stream_voice(
+    script: str = Body(..., embed=True),
+    voice_id: Optional[str] = Body(None, embed=True),
+    session_id: Optional[str] = Body(None, embed=True),
+    fresh: Optional[bool] = Body(False, embed=True)
+):
+    """
+    Like /voice, but the MP3 is forwarded to the client chunk by chunk as
+    ElevenLabs synthesizes it. The same bytes are written to the session as
+    voiceover.mp3, which is registered once the stream completes. The session ID
+    and the (URL-encoded) spoken text are returned in the X-Session-Id and
+    X-Voice-Text headers.
+    """
+    if session_id:
+        try:
+            check_session_id(session_id)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        voice_text = await run_in_threadpool(script_to_voice_text, script, fresh)
+        if not voice_text:
+            raise ValueError("No voice text generated from script.")
+        upstream = await stream_text_to_speech(voice_text, voice_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    session_id = session_id or str(uuid.uuid4())
+    session_store.create_session(session_id)
+    audio_path = session_store.asset_path(session_id, "voiceover.mp3")
+
+    async def audio():
+        part_path = audio_path + ".part"
+        hasher = hashlib.sha256()
+        try:
+            with open(part_path, "wb") as f:
+                async for chunk in upstream.aiter_bytes():
+                    f.write(chunk)
+                    hasher.update(chunk)
+                    yield chunk
+            os.replace(part_path, audio_path)
+            sha256 = await run_in_threadpool(blob_store.adopt, audio_path, hasher.hexdigest())
+            session_store.add_asset(session_id, "voiceover", audio_path, sha256=sha256)
+        finally:
+            # A client that disconnects early leaves no partial voiceover behind
+            await upstream.aclose()
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+    return StreamingResponse(
+        audio(),
+        media_type="audio/mpeg",
+        headers={"X-Session-Id": session_id, "X-Voice-Text": quote(voice_text)},
+        # Also runs when the client disconnects before the body starts, where
+        # the generator's finally never does
+        background=BackgroundTask(upstream.aclose)
+    )
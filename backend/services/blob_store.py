@@ -0,0 +1,116 @@
+import hashlib
+import os
+import shutil
+import time
+from typing import Dict, Iterable, Optional
+from services.session_store import UPLOAD_DIR
+
+BLOB_DIR = os.getenv("BLOB_DIR", os.path.join(UPLOAD_DIR, "blobs"))
+# Blobs younger than this are never collected, so a file adopted just before its
+# asset row is committed cannot be removed underneath it
+BLOB_GC_GRACE_SECONDS = int(os.getenv("BLOB_GC_GRACE_SECONDS", "3600"))
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class BlobStore:
+    """
+    Content-addressed storage for session media.
+
+    Every distinct file is kept once under blobs/<sha[:2]>/<sha>. Session asset
+    files are hardlinks to their blob, so re-uploading the same product video in
+    a new session costs a directory entry instead of another copy. The asset rows
+    in the session index are the references: a blob that no asset row points to
+    is garbage and is removed by collect_garbage.
+    """
+
+    def __init__(self, blob_dir: str = BLOB_DIR):
+        self.blob_dir = blob_dir
+        os.makedirs(blob_dir, exist_ok=True)
+        self.stored = 0
+        self.deduplicated = 0
+        self.bytes_saved = 0
+        # Links that fell back to a copy (blob dir on another filesystem)
+        self.copies = 0
+
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self.blob_dir, sha256[:2], sha256)
+
+    def adopt(self, path: str, sha256: Optional[str] = None) -> str:
+        """
+        Put the file at path into the store and return its content hash.
+
+        If an identical blob already exists, path is replaced by a link to it and
+        the duplicate bytes are dropped; otherwise path becomes the blob's first
+        link. Pass sha256 when it was computed while writing the file.
+        """
+        sha256 = sha256 or file_sha256(path)
+        blob = self.blob_path(sha256)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+
+        try:
+            os.link(path, blob)
+            self.stored += 1
+            return sha256
+        except FileExistsError:
+            pass
+        except OSError:
+            shutil.copyfile(path, blob)
+            self.stored += 1
+            self.copies += 1
+            return sha256
+
+        if os.path.samefile(blob, path):
+            return sha256
+        size = os.path.getsize(path)
+        tmp_path = path + ".link"
+        try:
+            os.link(blob, tmp_path)
+        except OSError:
+            self.copies += 1
+            return sha256
+        os.replace(tmp_path, path)
+        self.deduplicated += 1
+        self.bytes_saved += size
+        return sha256
+
+    def collect_garbage(self, referenced: Iterable[str], dry_run: bool = False) -> Dict[str, int]:
+        """Remove blobs that no asset references any more."""
+        referenced = set(referenced)
+        cutoff = time.time() - BLOB_GC_GRACE_SECONDS
+        removed = 0
+        freed = 0
+        kept = 0
+        for prefix in os.listdir(self.blob_dir):
+            prefix_dir = os.path.join(self.blob_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            with os.scandir(prefix_dir) as entries:
+                for entry in entries:
+                    stat = entry.stat()
+                    if entry.name in referenced or stat.st_mtime > cutoff:
+                        kept += 1
+                        continue
+                    if not dry_run:
+                        os.remove(entry.path)
+                    removed += 1
+                    freed += stat.st_size
+        return {"kept": kept, "removed": removed, "freed_bytes": freed}
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "stored": self.stored,
+            "deduplicated": self.deduplicated,
+            "bytes_saved": self.bytes_saved,
+            "copies": self.copies,
+        }
+
+
+blob_store = BlobStore()
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class TieredCache:
+    """
+    Two-tier cache for JSON-serialisable values: an in-memory LRU in front of an
+    optional on-disk store. Entries older than ttl_seconds are treated as misses,
+    and the disk tier is trimmed (oldest first) once it grows past max_disk_bytes.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        memory_entries: int = 256,
+        disk_dir: Optional[str] = None,
+        ttl_seconds: Optional[float] = None,
+        max_disk_bytes: Optional[int] = None
+    ):
+        self.name = name
+        self.memory_entries = memory_entries
+        self.disk_dir = disk_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes: Optional[int] = None
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypasses": 0, "evictions": 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[0]):
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return entry[1]
+            self._memory.pop(key, None)
+
+            entry = self._read_disk(key)
+            if entry is not None:
+                self._remember(key, entry)
+                self.counters["disk_hits"] += 1
+                return entry[1]
+
+            self.counters["misses"] += 1
+            return None
+
+    def set(self, key: str, value: Any):
+        entry = (time.time(), value)
+        with self._lock:
+            self._remember(key, entry)
+            self._write_disk(key, entry)
+
+    def record_bypass(self):
+        with self._lock:
+            self.counters["bypasses"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+            hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+            return {
+                **self.counters,
+                "hit_rate": round(hits / lookups, 3) if lookups else None,
+                "memory_entries": len(self._memory),
+                "disk_bytes": self._disk_bytes,
+            }
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    def _remember(self, key: str, entry: tuple):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[tuple]:
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self._expired(stored["created_at"]):
+            self._remove_file(path)
+            return None
+        # Touch the file so size-based eviction drops the least recently used entries
+        os.utime(path)
+        return stored["created_at"], stored["value"]
+
+    def _write_disk(self, key: str, entry: tuple):
+        if not self.disk_dir:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            self._remove_file(path)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"created_at": entry[0], "value": entry[1]}, f)
+        os.replace(tmp_path, path)
+        if self._disk_bytes is not None:
+            self._disk_bytes += os.path.getsize(path)
+        self._evict_disk()
+
+    def _remove_file(self, path: str):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        if self._disk_bytes is not None:
+            self._disk_bytes -= size
+
+    def _disk_files(self) -> list:
+        files = []
+        for root, _, names in os.walk(self.disk_dir):
+            for fname in names:
+                if fname.endswith(".json"):
+                    path = os.path.join(root, fname)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((st.st_mtime, st.st_size, path))
+        return files
+
+    def _evict_disk(self):
+        if not self.max_disk_bytes:
+            return
+        if self._disk_bytes is None:
+            self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+        # Trim to 90% of the limit so eviction does not run on every write
+        target = int(self.max_disk_bytes * 0.9)
+        for _, _, path in sorted(self._disk_files()):
+            if self._disk_bytes <= target:
+                break
+            self._remove_file(path)
+            self.counters["evictions"] += 1
@@ -0,0 +1,107 @@
+import asyncio
+import hashlib
+import os
+import time
+import httpx
+from typing import Any, Dict, Optional
+from services.http_clients import get_client
+
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(1024 * 1024)))
+DOWNLOAD_MAX_RETRIES = int(os.getenv("DOWNLOAD_MAX_RETRIES", "3"))
+
+
+def _total_size(response: httpx.Response, offset: int) -> Optional[int]:
+    """Full size of the remote file from Content-Range (206) or Content-Length (200)."""
+    content_range = response.headers.get("content-range")
+    if response.status_code == 206 and content_range and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        return int(total) if total.isdigit() else None
+    content_length = response.headers.get("content-length")
+    if content_length and content_length.isdigit():
+        return offset + int(content_length)
+    return None
+
+
+async def download_to_file(
+    url: str,
+    dest_path: str,
+    expected_size: Optional[int] = None,
+    expected_sha256: Optional[str] = None,
+    provider: str = "media",
+    timeout: float = 120.0
+) -> Dict[str, Any]:
+    """
+    Stream a remote file to dest_path in fixed-size chunks.
+
+    Interrupted transfers resume with an HTTP Range request from the last byte
+    written. The size is checked against the server's reported length (and
+    expected_size/expected_sha256 when given) before the file is moved into place.
+    Returns the path, size, sha256, elapsed seconds and throughput.
+    """
+    client = get_client(provider)
+    part_path = dest_path + ".part"
+    hasher = hashlib.sha256()
+    received = 0
+    total = None
+    retries = 0
+    resumes = 0
+    started = time.monotonic()
+
+    try:
+        with open(part_path, "wb") as f:
+            while True:
+                headers = {"Range": f"bytes={received}-"} if received else {}
+                try:
+                    async with client.stream("GET", url, headers=headers, timeout=timeout) as response:
+                        if received and response.status_code == 416 and received == total:
+                            break
+                        response.raise_for_status()
+                        if received and response.status_code != 206:
+                            # Server ignored the range, start over
+                            f.seek(0)
+                            f.truncate()
+                            hasher = hashlib.sha256()
+                            received = 0
+                        elif received:
+                            resumes += 1
+                        total = _total_size(response, received)
+
+                        async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                            f.write(chunk)
+                            hasher.update(chunk)
+                            received += len(chunk)
+
+                    if total is None or received >= total:
+                        break
+                    raise httpx.ReadError(f"Connection closed after {received} of {total} bytes")
+                except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                    retryable = not isinstance(e, httpx.HTTPStatusError) or e.response.status_code >= 500
+                    retries += 1
+                    if not retryable or retries > DOWNLOAD_MAX_RETRIES:
+                        raise
+                    await asyncio.sleep(min(2 ** retries, 10))
+
+        sha256 = hasher.hexdigest()
+        if total is not None and received != total:
+            raise Exception(f"Size mismatch: got {received} bytes, server reported {total}")
+        if expected_size is not None and received != expected_size:
+            raise Exception(f"Size mismatch: got {received} bytes, expected {expected_size}")
+        if expected_sha256 and sha256 != expected_sha256.lower():
+            raise Exception("Checksum mismatch")
+
+        os.replace(part_path, dest_path)
+    except Exception as e:
+        raise Exception(f"Download failed: {str(e)}")
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+    seconds = time.monotonic() - started
+    return {
+        "path": dest_path,
+        "size_bytes": received,
+        "sha256": sha256,
+        "seconds": round(seconds, 3),
+        "throughput_bytes_per_second": int(received / seconds) if seconds > 0 else None,
+        "resumes": resumes
+    }
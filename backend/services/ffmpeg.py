@@ -1,17 +1,93 @@
-import subprocess
+import asyncio
+import json
 import os
+import shutil
 import tempfile
-from typing import Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
+from services.cache import TieredCache
+from services.render_scheduler import RenderQueueFullError, render_scheduler, run_process
+
+# Part of the probe cache key; bump it when _parse_probe returns new fields
+PROBE_VERSION = 2
+probe_cache = TieredCache(
+    "probes",
+    memory_entries=int(os.getenv("PROBE_CACHE_MEMORY_ENTRIES", "512")),
+    disk_dir=os.getenv("PROBE_CACHE_DIR", "cache/probes"),
+    max_disk_bytes=int(os.getenv("PROBE_CACHE_MAX_BYTES", str(10 * 1024 * 1024)))
+)
+
+# Encoder settings per render purpose: draft favours speed, final favours size and quality.
+# +faststart moves the moov atom to the front so players can start before the download ends.
+ENCODER_PROFILES = {
+    "draft": {
+        "preset": os.getenv("RENDER_DRAFT_PRESET", "ultrafast"),
+        "crf": int(os.getenv("RENDER_DRAFT_CRF", "30")),
+        "audio_bitrate": "96k",
+        "faststart": True
+    },
+    "final": {
+        "preset": os.getenv("RENDER_FINAL_PRESET", "medium"),
+        "crf": int(os.getenv("RENDER_FINAL_CRF", "20")),
+        "audio_bitrate": "160k",
+        "faststart": True
+    },
+    # Used by render_preview only
+    "preview": {
+        "preset": "ultrafast",
+        "crf": int(os.getenv("PREVIEW_CRF", "32")),
+        "audio_bitrate": "64k",
+        "faststart": True
+    },
+}
+# Profiles a request may ask for; the preview profile is internal
+RENDER_PROFILES = ("draft", "final")
+DEFAULT_RENDER_PROFILE = os.getenv("RENDER_PROFILE", "final")
+# Backgrounds at least two segments long are rendered as up to RENDER_MAX_JOBS segments in parallel
+RENDER_MIN_SEGMENT_SECONDS = float(os.getenv("RENDER_MIN_SEGMENT_SECONDS", "10"))
+# Frames decoded before each segment start so the overlay input is in sync at the cut
+RENDER_SEGMENT_PREROLL_SECONDS = 1.0
+# Previews cover the start of the composite at a low resolution
+PREVIEW_SECONDS = float(os.getenv("PREVIEW_SECONDS", "5"))
+PREVIEW_HEIGHT = int(os.getenv("PREVIEW_HEIGHT", "360"))
+# Progressive output: HLS with fragmented MP4 segments, written next to the MP4
+HLS_SEGMENT_SECONDS = int(os.getenv("HLS_SEGMENT_SECONDS", "2"))
+HLS_PLAYLIST = "index.m3u8"
+# Output formats for render_layouts: canvas size, where the overlay goes and the
+# box (as fractions of the canvas) it is fitted into with its aspect ratio kept
+LAYOUT_PRESETS = {
+    "16:9": {"width": 1920, "height": 1080, "overlay_position": "bottom-right", "overlay_box": (0.4, 0.6)},
+    "9:16": {"width": 1080, "height": 1920, "overlay_position": "bottom-center", "overlay_box": (1.0, 0.45)},
+    "1:1": {"width": 1080, "height": 1080, "overlay_position": "bottom-right", "overlay_box": (0.5, 0.5)},
+}
+# Audio that already matches this is stream-copied instead of re-encoded
+TARGET_AUDIO = {"audio_codec": "aac", "sample_rate": 44100, "channels": 2}
+
+def _fraction(value: Optional[str]) -> Optional[float]:
+    """Parse an ffprobe rate such as '30000/1001'."""
+    try:
+        numerator, _, denominator = (value or "").partition("/")
+        return round(float(numerator) / float(denominator or 1), 3) or None
+    except (ValueError, ZeroDivisionError):
+        return None
+
+def _number(value: Any, cast=float) -> Optional[Any]:
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
 
 class FFmpegService:
     @staticmethod
-    def overlay_videos(
+    async def overlay_videos(
         background_video_path: str,
         overlay_video_path: str,
         output_path: str,
         overlay_position: str = "center",
         overlay_size: Optional[Tuple[int, int]] = None,
-        background_audio: bool = True
+        background_audio: bool = True,
+        profile: str = DEFAULT_RENDER_PROFILE,
+        segments: Optional[int] = None,
+        hls_dir: Optional[str] = None
     ) -> bool:
         """
         Overlay a video on top of another video using FFmpeg.
@@ -23,69 +99,543 @@ class FFmpegService:
             overlay_position: Position of overlay ('center', 'top-left', 'top-right', 'bottom-left', 'bottom-right')
             overlay_size: Optional tuple (width, height) to resize overlay
             background_audio: Whether to keep background video audio
+            profile: Encoder profile name from ENCODER_PROFILES ('draft' or 'final')
+            segments: Number of segments to render in parallel; None picks one from
+                the background duration and render slots, 1 forces a single pass
+            hls_dir: Also write the render as an HLS playlist in this directory,
+                segment by segment while encoding (implies a single pass)
         """
         try:
-            # Get video dimensions
-            bg_width, bg_height = FFmpegService._get_video_dimensions(background_video_path)
-            overlay_width, overlay_height = FFmpegService._get_video_dimensions(overlay_video_path)
+            # One probe per input, run together (and usually served from the cache)
+            background, overlay = await asyncio.gather(
+                FFmpegService.probe(background_video_path),
+                FFmpegService.probe(overlay_video_path)
+            )
+            overlay_width, overlay_height = overlay_size or (overlay["width"], overlay["height"])
             
             # Calculate overlay position
             x, y = FFmpegService._calculate_position(
-                overlay_position, bg_width, bg_height, overlay_width, overlay_height
+                overlay_position, background["width"], background["height"], overlay_width, overlay_height
             )
             
+            # HeyGen audio is always kept; background audio only when requested.
+            # Either input may be silent (Veo output often is).
+            audio_sources = []
+            if background_audio and background["has_audio"]:
+                audio_sources.append(("0:a", background))
+            if overlay["has_audio"]:
+                audio_sources.append(("1:a", overlay))
+            
+            if hls_dir:
+                # Segments must come out in order for the playlist to grow as it renders
+                segments = 1
+            elif segments is None:
+                segments = FFmpegService._auto_segments(background)
+            if segments > 1 and FFmpegService._can_segment(background, audio_sources):
+                return await FFmpegService._overlay_segmented(
+                    background_video_path, overlay_video_path, output_path,
+                    background, overlay, x, y, overlay_size, audio_sources, profile, segments
+                )
+            
+            # A single source already in the target format is passed through untouched
+            copy_audio = FFmpegService._can_copy_audio(audio_sources)
+            audio_inputs = [] if copy_audio else [stream for stream, _ in audio_sources]
+            
             # Build FFmpeg command
             cmd = [
                 "ffmpeg", "-y",  # Overwrite output file
                 "-i", background_video_path,
                 "-i", overlay_video_path,
                 "-filter_complex", FFmpegService._build_filter_complex(
-                    x, y, overlay_size, background_audio
+                    x, y, overlay_size, audio_inputs
                 ),
-                "-c:a", "aac" if background_audio else "an",
-                output_path
+                "-map", "[v]",
+                *FFmpegService._video_encoder_args(profile),
+                *FFmpegService._audio_output_args(audio_sources, profile),
+                *render_scheduler.thread_args(),
+                *FFmpegService._output_args(output_path, profile, hls_dir)
             ]
             
-            # Execute FFmpeg command
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=300  # 5 minutes timeout
-            )
+            # Execute FFmpeg command once a render slot is free
+            result = await render_scheduler.run(cmd)
             
-            if result.returncode != 0:
-                print(f"FFmpeg error: {result.stderr}")
+            if result["returncode"] != 0:
+                print(f"FFmpeg error: {result['stderr']}")
                 return False
                 
             return True
             
+        except RenderQueueFullError:
+            raise
         except Exception as e:
             print(f"Video overlay failed: {str(e)}")
             return False
     
     @staticmethod
-    def _get_video_dimensions(video_path: str) -> Tuple[int, int]:
-        """Get video width and height using FFprobe."""
+    async def render_preview(
+        background_video_path: str,
+        overlay_video_path: str,
+        output_path: str,
+        overlay_position: str = "center",
+        overlay_size: Optional[Tuple[int, int]] = None,
+        background_audio: bool = True,
+        seconds: float = PREVIEW_SECONDS,
+        height: int = PREVIEW_HEIGHT
+    ) -> bool:
+        """
+        Render the first seconds of the composite at a low resolution with the
+        ultrafast preset. The layout is computed exactly as in overlay_videos and
+        the composed frame is scaled down, so the preview shows the final framing.
+        """
         try:
+            background, overlay = await asyncio.gather(
+                FFmpegService.probe(background_video_path),
+                FFmpegService.probe(overlay_video_path)
+            )
+            overlay_width, overlay_height = overlay_size or (overlay["width"], overlay["height"])
+            x, y = FFmpegService._calculate_position(
+                overlay_position, background["width"], background["height"], overlay_width, overlay_height
+            )
+            
+            audio_sources = []
+            if background_audio and background["has_audio"]:
+                audio_sources.append(("0:a", background))
+            if overlay["has_audio"]:
+                audio_sources.append(("1:a", overlay))
+            copy_audio = FFmpegService._can_copy_audio(audio_sources)
+            audio_inputs = [] if copy_audio else [stream for stream, _ in audio_sources]
+            
+            graph = FFmpegService._build_filter_complex(x, y, overlay_size, audio_inputs)
+            # Scale the composed frame down; -2 keeps the width even
+            height = min(height, background["height"])
+            
+            # -t on the inputs stops decoding after the preview window
             cmd = [
-                "ffprobe",
-                "-v", "quiet",
-                "-select_streams", "v:0",
-                "-show_entries", "stream=width,height",
-                "-of", "csv=p=0",
-                video_path
+                "ffmpeg", "-y",
+                "-t", str(seconds), "-i", background_video_path,
+                "-t", str(seconds), "-i", overlay_video_path,
+                "-filter_complex", f"{graph};[v]scale=-2:{height}[preview]",
+                "-map", "[preview]",
+                *FFmpegService._video_encoder_args("preview"),
+                *FFmpegService._audio_output_args(audio_sources, "preview"),
+                *FFmpegService._container_args("preview"),
+                "-t", str(seconds),
+                *render_scheduler.thread_args(),
+                output_path
             ]
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            if result.returncode != 0:
-                raise Exception(f"FFprobe failed: {result.stderr}")
+            result = await render_scheduler.run(cmd)
+            if result["returncode"] != 0:
+                print(f"FFmpeg error: {result['stderr']}")
+                return False
+            return True
             
-            dimensions = result.stdout.strip().split(',')
-            return int(dimensions[0]), int(dimensions[1])
+        except RenderQueueFullError:
+            raise
+        except Exception as e:
+            print(f"Preview render failed: {str(e)}")
+            return False
+    
+    @staticmethod
+    async def render_layouts(
+        background_video_path: str,
+        overlay_video_path: str,
+        outputs: List[Dict[str, Any]],
+        background_audio: bool = True,
+        profile: str = DEFAULT_RENDER_PROFILE
+    ) -> bool:
+        """
+        Render several output layouts in one FFmpeg invocation. Both inputs are
+        decoded once and fanned out with split/asplit, so N formats cost N
+        encodes but a single decode.
+        
+        Each output is a dict with "path" and optionally:
+            width, height: canvas size; the background is scaled to cover it and
+                centre-cropped. Omitted keeps the background as it is.
+            overlay_position: as in overlay_videos
+            overlay_size: (width, height) for the overlay, or
+            overlay_box: (width, height) fractions of the canvas the overlay is fitted into
+            hls_dir: also write this output as HLS, as in overlay_videos
+        A LAYOUT_PRESETS entry plus a "path" is a valid output.
+        """
+        try:
+            background, overlay = await asyncio.gather(
+                FFmpegService.probe(background_video_path),
+                FFmpegService.probe(overlay_video_path)
+            )
+            audio_sources = []
+            if background_audio and background["has_audio"]:
+                audio_sources.append(("0:a", background))
+            if overlay["has_audio"]:
+                audio_sources.append(("1:a", overlay))
+            copy_audio = FFmpegService._can_copy_audio(audio_sources)
+            audio_inputs = [] if copy_audio else [stream for stream, _ in audio_sources]
+            
+            count = len(outputs)
+            filters = []
+            if count > 1:
+                filters.append("[0:v]split={}{}".format(count, "".join(f"[bgin{i}]" for i in range(count))))
+                filters.append("[1:v]split={}{}".format(count, "".join(f"[ovin{i}]" for i in range(count))))
+            for index, layout in enumerate(outputs):
+                bg_label = f"[bgin{index}]" if count > 1 else "[0:v]"
+                ov_label = f"[ovin{index}]" if count > 1 else "[1:v]"
+                
+                canvas_width = layout.get("width") or background["width"]
+                canvas_height = layout.get("height") or background["height"]
+                if layout.get("width") and layout.get("height"):
+                    filters.append(
+                        f"{bg_label}scale={canvas_width}:{canvas_height}:force_original_aspect_ratio=increase,"
+                        f"crop={canvas_width}:{canvas_height},setsar=1[bg{index}]"
+                    )
+                    bg_label = f"[bg{index}]"
+                
+                overlay_width, overlay_height = FFmpegService._fit_overlay(
+                    layout, overlay["width"], overlay["height"], canvas_width, canvas_height
+                )
+                if (overlay_width, overlay_height) != (overlay["width"], overlay["height"]):
+                    filters.append(f"{ov_label}scale={overlay_width}:{overlay_height}[ov{index}]")
+                    ov_label = f"[ov{index}]"
+                
+                x, y = FFmpegService._calculate_position(
+                    layout.get("overlay_position", "center"),
+                    canvas_width, canvas_height, overlay_width, overlay_height
+                )
+                filters.append(f"{bg_label}{ov_label}overlay={x}:{y}[v{index}]")
+            
+            filters += FFmpegService._audio_filters(audio_inputs)
+            if audio_inputs and count > 1:
+                filters.append("[a]asplit={}{}".format(count, "".join(f"[aout{i}]" for i in range(count))))
+            
+            cmd = [
+                "ffmpeg", "-y",
+                "-i", background_video_path,
+                "-i", overlay_video_path,
+                "-filter_complex", ";".join(filters)
+            ]
+            for index, layout in enumerate(outputs):
+                cmd += ["-map", f"[v{index}]", *FFmpegService._video_encoder_args(profile)]
+                if copy_audio:
+                    cmd += ["-map", audio_sources[0][0], "-c:a", "copy", "-shortest"]
+                elif audio_inputs:
+                    audio_label = f"[aout{index}]" if count > 1 else "[a]"
+                    cmd += ["-map", audio_label, *FFmpegService._audio_encoder_args(profile), "-shortest"]
+                else:
+                    cmd += ["-an"]
+                cmd += [
+                    *render_scheduler.thread_args(outputs=count),
+                    *FFmpegService._output_args(layout["path"], profile, layout.get("hls_dir"))
+                ]
             
+            result = await render_scheduler.run(cmd)
+            if result["returncode"] != 0:
+                print(f"FFmpeg error: {result['stderr']}")
+                return False
+            return True
+            
+        except RenderQueueFullError:
+            raise
         except Exception as e:
-            raise Exception(f"Failed to get video dimensions: {str(e)}")
+            print(f"Layout render failed: {str(e)}")
+            return False
+    
+    @staticmethod
+    def _fit_overlay(
+        layout: Dict[str, Any],
+        overlay_width: int,
+        overlay_height: int,
+        canvas_width: int,
+        canvas_height: int
+    ) -> Tuple[int, int]:
+        """Overlay size for a layout: explicit, fitted into a canvas box, or unchanged."""
+        if layout.get("overlay_size"):
+            return tuple(layout["overlay_size"])
+        if layout.get("overlay_box"):
+            box_width, box_height = layout["overlay_box"]
+            scale = min(canvas_width * box_width / overlay_width, canvas_height * box_height / overlay_height)
+            # Even dimensions, as yuv420p requires
+            return max(2, int(overlay_width * scale) // 2 * 2), max(2, int(overlay_height * scale) // 2 * 2)
+        return overlay_width, overlay_height
+    
+    @staticmethod
+    def _can_segment(background: Dict[str, Any], audio_sources: List[Tuple[str, Dict[str, Any]]]) -> bool:
+        """
+        Whether a segmented render ends where a single pass would. The single pass
+        stops at the shorter of the background video and the mapped audio
+        (-shortest; mixed audio lasts as long as its longest source), while segment
+        bounds come from the background alone, so audio that ends first (e.g. a
+        HeyGen clip shorter than the Veo background, without background audio)
+        needs a single pass.
+        """
+        fps = background.get("fps")
+        if not fps or not background.get("duration"):
+            return False
+        if not audio_sources:
+            return True
+        video_end = (background.get("frames") or round(background["duration"] * fps)) / fps
+        audio_end = max(source.get("audio_duration") or source.get("duration") or 0 for _, source in audio_sources)
+        return audio_end >= video_end
+    
+    @staticmethod
+    def _auto_segments(background: Dict[str, Any]) -> int:
+        duration = background.get("duration") or 0
+        return max(1, min(render_scheduler.max_jobs, int(duration // RENDER_MIN_SEGMENT_SECONDS)))
+    
+    @staticmethod
+    async def _overlay_segmented(
+        background_video_path: str,
+        overlay_video_path: str,
+        output_path: str,
+        background: Dict[str, Any],
+        overlay: Dict[str, Any],
+        x: int,
+        y: int,
+        overlay_size: Optional[Tuple[int, int]],
+        audio_sources: List[Tuple[str, Dict[str, Any]]],
+        profile: str,
+        segments: int
+    ) -> bool:
+        """
+        Render the overlay as independent video segments in parallel and join
+        them with the concat demuxer without re-encoding.
+        
+        Cuts fall on background frame boundaries and every segment is its own
+        encode, so each starts on a keyframe (GOP-aligned) and the joined stream
+        holds exactly the frames of a single-pass render. Each segment seeks a
+        little before its cut and trims the pre-roll after the overlay filter, so
+        the overlay input is positioned exactly as in one continuous pass. Audio
+        is rendered once, alongside the segments, rather than per segment, which
+        would leave encoder priming gaps at every join.
+        """
+        fps = background["fps"]
+        total_frames = background.get("frames") or round(background["duration"] * fps)
+        bounds = [round(k * total_frames / segments) for k in range(segments + 1)]
+        preroll_frames = max(1, round(RENDER_SEGMENT_PREROLL_SECONDS * fps))
+        graph = FFmpegService._build_filter_complex(x, y, overlay_size, [])
+        
+        work_dir = tempfile.mkdtemp(prefix=".segments_", dir=os.path.dirname(os.path.abspath(output_path)))
+        try:
+            commands = []
+            segment_paths = []
+            for index, (start, end) in enumerate(zip(bounds, bounds[1:])):
+                segment_path = os.path.join(work_dir, f"segment_{index:03d}.mp4")
+                segment_paths.append(segment_path)
+                preroll = min(start, preroll_frames)
+                cmd = ["ffmpeg", "-y"]
+                if start:
+                    # Half a frame early so the frame exactly on the grid is kept
+                    seek = f"{(start - preroll - 0.5) / fps:.6f}"
+                    # The overlay keeps every frame from the keyframe before the seek point
+                    # (timestamps stay relative to it), so an overlay that ended before this
+                    # segment still supplies the last frame a single pass would repeat
+                    cmd += [
+                        "-ss", seek, "-i", background_video_path,
+                        "-noaccurate_seek", "-ss", seek, "-i", overlay_video_path
+                    ]
+                else:
+                    cmd += ["-i", background_video_path, "-i", overlay_video_path]
+                cmd += [
+                    "-filter_complex", f"{graph};[v]trim=start_frame={preroll},setpts=PTS-STARTPTS[segment]",
+                    "-map", "[segment]",
+                    *FFmpegService._video_encoder_args(profile),
+                    # Keep the trimmed frames' own timestamps; CFR resampling would drop one
+                    "-fps_mode", "passthrough",
+                    "-an"
+                ]
+                # The last segment runs to the end of the background, like a single pass
+                if index < segments - 1:
+                    cmd += ["-frames:v", str(end - start)]
+                cmd += [*render_scheduler.thread_args(), segment_path]
+                commands.append(cmd)
+            
+            audio_path = None
+            if audio_sources:
+                audio_path = os.path.join(work_dir, "audio.m4a")
+                copy_audio = FFmpegService._can_copy_audio(audio_sources)
+                audio_inputs = [] if copy_audio else [stream for stream, _ in audio_sources]
+                cmd = ["ffmpeg", "-y", "-i", background_video_path, "-i", overlay_video_path]
+                if audio_inputs:
+                    cmd += ["-filter_complex", ";".join(FFmpegService._audio_filters(audio_inputs))]
+                cmd += [
+                    *FFmpegService._audio_output_args(audio_sources, profile, shortest=False),
+                    "-vn",
+                    "-t", f"{total_frames / fps:.6f}",
+                    *render_scheduler.thread_args(),
+                    audio_path
+                ]
+                commands.append(cmd)
+            
+            tasks = [asyncio.create_task(render_scheduler.run(cmd)) for cmd in commands]
+            try:
+                results = await asyncio.gather(*tasks)
+            finally:
+                # On failure or cancellation, stop (and kill) the renders still running
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+            failed = next((result for result in results if result["returncode"] != 0), None)
+            if failed:
+                print(f"FFmpeg segment error: {failed['stderr']}")
+                return False
+            
+            concat_list = os.path.join(work_dir, "segments.txt")
+            with open(concat_list, "w") as f:
+                for segment_path, start, end in zip(segment_paths, bounds, bounds[1:]):
+                    # Exact durations, so each segment starts right after the previous
+                    # one's last frame rather than at that frame's timestamp
+                    f.write(f"file '{segment_path}'\nduration {(end - start) / fps:.6f}\n")
+            cmd = ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", concat_list]
+            if audio_path:
+                cmd += ["-i", audio_path, "-map", "0:v", "-map", "1:a"]
+            cmd += ["-c", "copy", *FFmpegService._container_args(profile), output_path]
+            result = await render_scheduler.run(cmd)
+            if result["returncode"] != 0:
+                print(f"FFmpeg concat error: {result['stderr']}")
+                return False
+            return True
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    @staticmethod
+    async def probe(path: str, content_hash: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Read dimensions, duration, frame rate, codecs and audio presence with a
+        single ffprobe call. Results are cached by content hash when known, or
+        by path, mtime and size, so every operation on a file shares one probe.
+        """
+        if content_hash:
+            key = TieredCache.make_key("probe", PROBE_VERSION, content_hash)
+        else:
+            stat = os.stat(path)
+            key = TieredCache.make_key("probe", PROBE_VERSION, os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        info = probe_cache.get(key)
+        if info is not None:
+            return info
+        
+        cmd = [
+            "ffprobe",
+            "-v", "error",
+            "-print_format", "json",
+            "-show_format",
+            "-show_streams",
+            path
+        ]
+        # Probes are cheap, so they do not wait for a render slot
+        result = await run_process(cmd, timeout=30)
+        if result["returncode"] != 0:
+            raise Exception(f"FFprobe failed: {result['stderr']}")
+        
+        info = FFmpegService._parse_probe(json.loads(result["stdout"] or "{}"))
+        probe_cache.set(key, info)
+        return info
+    
+    @staticmethod
+    def _parse_probe(data: Dict[str, Any]) -> Dict[str, Any]:
+        streams = data.get("streams", [])
+        fmt = data.get("format", {})
+        video = next((s for s in streams if s.get("codec_type") == "video" and not s.get("disposition", {}).get("attached_pic")), None)
+        audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+        duration = _number(fmt.get("duration")) or _number((video or audio or {}).get("duration"))
+        return {
+            "format": fmt.get("format_name"),
+            "duration": duration,
+            "size": _number(fmt.get("size"), int),
+            "bit_rate": _number(fmt.get("bit_rate"), int),
+            "has_video": video is not None,
+            "width": video.get("width") if video else None,
+            "height": video.get("height") if video else None,
+            "fps": _fraction(video.get("avg_frame_rate")) or _fraction(video.get("r_frame_rate")) if video else None,
+            "frames": _number(video.get("nb_frames"), int) if video else None,
+            "video_codec": video.get("codec_name") if video else None,
+            "pix_fmt": video.get("pix_fmt") if video else None,
+            "has_audio": audio is not None,
+            "audio_duration": _number(audio.get("duration")) if audio else None,
+            "audio_codec": audio.get("codec_name") if audio else None,
+            "sample_rate": _number(audio.get("sample_rate"), int) if audio else None,
+            "channels": audio.get("channels") if audio else None,
+        }
+    
+    @staticmethod
+    def _profile(profile: str) -> Dict[str, Any]:
+        if profile not in ENCODER_PROFILES:
+            raise ValueError(f"Unknown render profile '{profile}', expected one of {', '.join(ENCODER_PROFILES)}")
+        return ENCODER_PROFILES[profile]
+    
+    @staticmethod
+    def _video_encoder_args(profile: str) -> List[str]:
+        settings = FFmpegService._profile(profile)
+        return [
+            "-c:v", "libx264",
+            "-preset", settings["preset"],
+            "-crf", str(settings["crf"]),
+            "-pix_fmt", "yuv420p"
+        ]
+    
+    @staticmethod
+    def _audio_encoder_args(profile: str) -> List[str]:
+        return ["-c:a", "aac", "-b:a", FFmpegService._profile(profile)["audio_bitrate"]]
+    
+    @staticmethod
+    def _can_copy_audio(audio_sources: List[Tuple[str, Dict[str, Any]]]) -> bool:
+        return len(audio_sources) == 1 and FFmpegService._matches_target_audio(audio_sources[0][1])
+    
+    @staticmethod
+    def _audio_output_args(
+        audio_sources: List[Tuple[str, Dict[str, Any]]],
+        profile: str,
+        shortest: bool = True
+    ) -> List[str]:
+        """Map and encode (or copy) the audio chosen for a render; [a] is the mixed label."""
+        if not audio_sources:
+            return ["-an"]
+        if FFmpegService._can_copy_audio(audio_sources):
+            args = ["-map", audio_sources[0][0], "-c:a", "copy"]
+        else:
+            args = ["-map", "[a]", *FFmpegService._audio_encoder_args(profile)]
+        return args + (["-shortest"] if shortest else [])
+    
+    @staticmethod
+    def _container_args(profile: str) -> List[str]:
+        return ["-movflags", "+faststart"] if FFmpegService._profile(profile)["faststart"] else []
+    
+    @staticmethod
+    def _output_args(output_path: str, profile: str, hls_dir: Optional[str] = None) -> List[str]:
+        """
+        Muxer options and destination for a render. With hls_dir, the tee muxer
+        writes the same encoded stream both to the MP4 and to an event playlist of
+        fragmented MP4 segments in hls_dir. Each segment and the playlist are
+        renamed into place once complete, so they can be served while FFmpeg is
+        still running. Keyframes are forced on segment boundaries.
+        """
+        if not hls_dir:
+            return [*FFmpegService._container_args(profile), output_path]
+        
+        # Leftovers from an earlier render would be listed in the new playlist
+        shutil.rmtree(hls_dir, ignore_errors=True)
+        os.makedirs(hls_dir, exist_ok=True)
+        mp4_options = ["f=mp4"]
+        if FFmpegService._profile(profile)["faststart"]:
+            mp4_options.append("movflags=+faststart")
+        hls_options = [
+            "f=hls",
+            f"hls_time={HLS_SEGMENT_SECONDS}",
+            "hls_playlist_type=event",
+            "hls_segment_type=fmp4",
+            "hls_fmp4_init_filename=init.mp4",
+            f"hls_segment_filename={os.path.join(hls_dir, 'segment_%05d.m4s')}",
+            "hls_flags=independent_segments+temp_file",
+        ]
+        return [
+            "-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
+            "-f", "tee",
+            "[{}]{}|[{}]{}".format(
+                ":".join(mp4_options), output_path,
+                ":".join(hls_options), os.path.join(hls_dir, HLS_PLAYLIST)
+            )
+        ]
+    
+    @staticmethod
+    def _matches_target_audio(info: Dict[str, Any]) -> bool:
+        return all(info.get(field) == value for field, value in TARGET_AUDIO.items())
     
     @staticmethod
     def _calculate_position(
@@ -111,6 +661,9 @@ class FFmpegService:
         elif position == "bottom-right":
             x = bg_width - overlay_width
             y = bg_height - overlay_height
+        elif position == "bottom-center":
+            x = (bg_width - overlay_width) // 2
+            y = bg_height - overlay_height
         else:
             x = (bg_width - overlay_width) // 2
             y = (bg_height - overlay_height) // 2
@@ -122,9 +675,13 @@ class FFmpegService:
         x: int,
         y: int,
         overlay_size: Optional[Tuple[int, int]],
-        background_audio: bool
+        audio_inputs: List[str]
     ) -> str:
-        """Build FFmpeg filter complex string."""
+        """
+        Build the FFmpeg filter graph. Video is labelled [v]; audio from
+        audio_inputs (e.g. ["0:a", "1:a"]) is normalised, mixed if there is
+        more than one, and labelled [a].
+        """
         filters = []
         
         # Scale overlay if size specified
@@ -138,55 +695,91 @@ class FFmpegService:
         filters.append(f"[0:v]{overlay_input}overlay={x}:{y}[v]")
         
         # Audio handling
-        if background_audio:
-            filters.append("[0:a]aformat=sample_fmts=fltp:sample_rates=44100:channel_layouts=stereo[a]")
-        
-        # Output mapping
-        output_mapping = "[v]"
-        if background_audio:
-            output_mapping += "[a]"
+        filters += FFmpegService._audio_filters(audio_inputs)
         
-        return ";".join(filters) + f";{output_mapping}"
+        return ";".join(filters)
     
     @staticmethod
-    def resize_video(
+    def _audio_filters(audio_inputs: List[str]) -> List[str]:
+        audio_format = "aformat=sample_fmts=fltp:sample_rates=44100:channel_layouts=stereo"
+        if len(audio_inputs) == 1:
+            return [f"[{audio_inputs[0]}]{audio_format}[a]"]
+        filters = []
+        labels = []
+        for index, stream in enumerate(audio_inputs):
+            filters.append(f"[{stream}]{audio_format}[a{index}]")
+            labels.append(f"[a{index}]")
+        if labels:
+            filters.append(f"{''.join(labels)}amix=inputs={len(labels)}:duration=longest:normalize=0[a]")
+        return filters
+    
+    @staticmethod
+    async def resize_video(
         input_path: str,
         output_path: str,
         width: int,
-        height: int
+        height: int,
+        profile: str = DEFAULT_RENDER_PROFILE
     ) -> bool:
-        """Resize a video to specified dimensions."""
+        """
+        Resize a video to specified dimensions. An H.264 input that is already
+        the target size is only remuxed (stream copy) instead of re-encoded.
+        """
         try:
-            cmd = [
-                "ffmpeg", "-y",
-                "-i", input_path,
-                "-vf", f"scale={width}:{height}",
-                "-c:a", "copy",
+            info = await FFmpegService.probe(input_path)
+            passthrough = (
+                info["width"] == width
+                and info["height"] == height
+                and info["video_codec"] == "h264"
+            )
+            
+            cmd = ["ffmpeg", "-y", "-i", input_path]
+            if passthrough:
+                cmd += ["-c", "copy"]
+            else:
+                cmd += [
+                    "-vf", f"scale={width}:{height}",
+                    *FFmpegService._video_encoder_args(profile),
+                    "-c:a", "copy"
+                ]
+            cmd += [
+                *FFmpegService._container_args(profile),
+                *render_scheduler.thread_args(),
                 output_path
             ]
             
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-            return result.returncode == 0
+            result = await render_scheduler.run(cmd)
+            return result["returncode"] == 0
             
+        except RenderQueueFullError:
+            raise
         except Exception as e:
             print(f"Video resize failed: {str(e)}")
             return False
     
     @staticmethod
-    def extract_audio(input_path: str, output_path: str) -> bool:
+    async def extract_audio(input_path: str, output_path: str) -> bool:
         """Extract audio from video."""
         try:
+            info = await FFmpegService.probe(input_path)
+            if not info["has_audio"]:
+                return False
+            
             cmd = [
                 "ffmpeg", "-y",
                 "-i", input_path,
                 "-vn",
-                "-acodec", "mp3",
+                # MP3 audio is copied out as-is rather than transcoded
+                "-acodec", "copy" if info["audio_codec"] == "mp3" else "mp3",
+                *render_scheduler.thread_args(),
                 output_path
             ]
             
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-            return result.returncode == 0
+            result = await render_scheduler.run(cmd)
+            return result["returncode"] == 0
             
+        except RenderQueueFullError:
+            raise
         except Exception as e:
             print(f"Audio extraction failed: {str(e)}")
             return False
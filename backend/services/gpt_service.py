@@ -1,23 +1,62 @@
 import os
 import openai
 from dotenv import load_dotenv
+from typing import Dict, List
+from services.cache import TieredCache
 
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
-def generate_ad_script(prompt: str) -> str:
+completion_cache = TieredCache(
+    "completions",
+    memory_entries=int(os.getenv("COMPLETION_CACHE_MEMORY_ENTRIES", "512")),
+    disk_dir=os.getenv("COMPLETION_CACHE_DIR", "cache/completions"),
+    ttl_seconds=float(os.getenv("COMPLETION_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+    max_disk_bytes=int(os.getenv("COMPLETION_CACHE_MAX_BYTES", str(100 * 1024 * 1024)))
+)
+
+def chat_completion(
+    messages: List[Dict[str, str]],
+    model: str = "gpt-3.5-turbo",
+    max_tokens: int = 300,
+    temperature: float = 0.7,
+    fresh: bool = False
+) -> str:
+    """
+    Run a chat completion, reusing a cached answer for identical
+    (model, messages, temperature, max_tokens) requests.
+    Pass fresh=True to skip the lookup and get a new variant (which replaces the cached one).
+    """
+    key = TieredCache.make_key(model, messages, temperature, max_tokens)
+    if fresh:
+        completion_cache.record_bypass()
+    else:
+        cached = completion_cache.get(key)
+        if cached is not None:
+            return cached
+
     response = openai.chat.completions.create(
-        model="gpt-3.5-turbo",
+        model=model,
+        messages=messages,
+        max_tokens=max_tokens,
+        temperature=temperature,
+    )
+    content = response.choices[0].message.content.strip()
+    completion_cache.set(key, content)
+    return content
+
+def generate_ad_script(prompt: str, fresh: bool = False) -> str:
+    return chat_completion(
         messages=[
             {"role": "system", "content": "You are an expert ad copywriter."},
             {"role": "user", "content": prompt}
         ],
         max_tokens=300,
         temperature=0.7,
+        fresh=fresh
     )
-    return response.choices[0].message.content.strip()
 
-def generate_image_prompt(user_input: str, style: str = "realistic", tone: str = "professional", model: str = "gpt-3.5-turbo") -> str:
+def generate_image_prompt(user_input: str, style: str = "realistic", tone: str = "professional", model: str = "gpt-3.5-turbo", fresh: bool = False) -> str:
     """
     Generate an optimized image prompt using GPT (default: gpt-3.5-turbo) based on user input.
     
@@ -26,6 +65,7 @@ def generate_image_prompt(user_input: str, style: str = "realistic", tone: str =
         style: Visual style (realistic, artistic, minimalist, etc.)
         tone: Tone/mood (professional, fun, luxury, etc.)
         model: OpenAI model to use (default: gpt-3.5-turbo)
+        fresh: Skip the completion cache and generate a new variant
     """
     system_prompt = """You are an expert at creating detailed, optimized image generation prompts. 
     Your task is to transform user descriptions into highly detailed prompts that will generate 
@@ -50,14 +90,13 @@ def generate_image_prompt(user_input: str, style: str = "realistic", tone: str =
     Make it detailed and specific for professional image generation.
     """
     
-    response = openai.chat.completions.create(
-        model=model,
+    return chat_completion(
         messages=[
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
         ],
+        model=model,
         max_tokens=500,
         temperature=0.7,
-    )
-    
-    return response.choices[0].message.content.strip()
\ No newline at end of file
+        fresh=fresh
+    )
\ No newline at end of file
@@ -0,0 +1,172 @@
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+HEYGEN_TYPICAL_RENDER_SECONDS = float(os.getenv("HEYGEN_TYPICAL_RENDER_SECONDS", "120"))
+HEYGEN_MIN_POLL_SECONDS = float(os.getenv("HEYGEN_MIN_POLL_SECONDS", "3"))
+HEYGEN_MAX_POLL_SECONDS = float(os.getenv("HEYGEN_MAX_POLL_SECONDS", "30"))
+HEYGEN_RENDER_TIMEOUT = float(os.getenv("HEYGEN_RENDER_TIMEOUT", "900"))
+HEYGEN_MAX_POLL_ERRORS = int(os.getenv("HEYGEN_MAX_POLL_ERRORS", "5"))
+# With a webhook receiver configured, polling is only a slow safety net
+HEYGEN_WEBHOOK_SECRET = os.getenv("HEYGEN_WEBHOOK_SECRET")
+HEYGEN_WEBHOOK_SAFETY_POLL_SECONDS = float(os.getenv("HEYGEN_WEBHOOK_SAFETY_POLL_SECONDS", "120"))
+
+StatusFetcher = Callable[[str], Awaitable[Dict[str, Any]]]
+
+
+class _TrackedVideo:
+    def __init__(self, video_id: str, fetch_status: StatusFetcher):
+        self.video_id = video_id
+        self.fetch_status = fetch_status
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.started_at = time.monotonic()
+        self.next_poll_at = self.started_at
+        self.polls = 0
+        self.errors = 0
+        self.waiters = 0
+
+
+class HeyGenStatusPoller:
+    """
+    Tracks every outstanding HeyGen video_id and polls them from one background task.
+
+    Poll intervals adapt to how long the video has been rendering compared to the
+    typical render time: sparse early on, dense around the expected finish, then
+    backing off exponentially for renders that run long. Waiters are resolved when
+    a poll or a webhook reports the video as completed or failed.
+    """
+
+    def __init__(self):
+        self._videos: Dict[str, _TrackedVideo] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.typical_render_seconds = HEYGEN_TYPICAL_RENDER_SECONDS
+        self.total_polls = 0
+        self.webhook_completions = 0
+
+    async def wait(self, video_id: str, fetch_status: StatusFetcher) -> Dict[str, Any]:
+        """Wait until video_id is completed and return its status, raising if it fails or times out."""
+        tracked = self._videos.get(video_id)
+        if tracked is None:
+            tracked = _TrackedVideo(video_id, fetch_status)
+            self._videos[video_id] = tracked
+            self._ensure_running()
+            self._wakeup.set()
+
+        tracked.waiters += 1
+        try:
+            return await asyncio.shield(tracked.future)
+        finally:
+            tracked.waiters -= 1
+            if tracked.waiters == 0 and not tracked.future.done():
+                # Nobody is interested any more, stop polling it
+                tracked.future.cancel()
+                self._videos.pop(video_id, None)
+
+    def complete(self, video_id: str, result: Dict[str, Any]) -> bool:
+        """Resolve waiters for video_id. Returns False if the video is not being tracked."""
+        tracked = self._videos.pop(video_id, None)
+        if tracked is None or tracked.future.done():
+            return False
+        elapsed = time.monotonic() - tracked.started_at
+        # Exponentially weighted average keeps the backoff tuned to current render times
+        self.typical_render_seconds = 0.8 * self.typical_render_seconds + 0.2 * elapsed
+        tracked.future.set_result(result)
+        return True
+
+    def fail(self, video_id: str, error: str) -> bool:
+        tracked = self._videos.pop(video_id, None)
+        if tracked is None or tracked.future.done():
+            return False
+        tracked.future.set_exception(Exception(error))
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tracked_videos": len(self._videos),
+            "typical_render_seconds": round(self.typical_render_seconds, 1),
+            "total_polls": self.total_polls,
+            "webhook_completions": self.webhook_completions,
+        }
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for video_id in list(self._videos):
+            self.fail(video_id, "HeyGen status poller stopped")
+
+    def _next_interval(self, tracked: _TrackedVideo) -> float:
+        if HEYGEN_WEBHOOK_SECRET:
+            return HEYGEN_WEBHOOK_SAFETY_POLL_SECONDS
+
+        elapsed = time.monotonic() - tracked.started_at
+        remaining = self.typical_render_seconds - elapsed
+        if remaining > 0:
+            interval = remaining / 2
+        else:
+            overdue = -remaining / max(self.typical_render_seconds, 1.0)
+            interval = HEYGEN_MIN_POLL_SECONDS * (2 ** overdue)
+        return min(max(interval, HEYGEN_MIN_POLL_SECONDS), HEYGEN_MAX_POLL_SECONDS)
+
+    def _ensure_running(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        try:
+            while True:
+                now = time.monotonic()
+                due = [t for t in self._videos.values() if t.next_poll_at <= now]
+                if due:
+                    await asyncio.gather(*(self._poll(t) for t in due))
+                    continue
+
+                self._wakeup.clear()
+                timeout = None
+                if self._videos:
+                    timeout = max(0.0, min(t.next_poll_at for t in self._videos.values()) - now)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        except Exception as e:
+            # Nothing resolves the waiters once the loop is gone, so fail them rather
+            # than leave them hanging; the next wait() starts a new loop
+            for video_id in list(self._videos):
+                self.fail(video_id, f"HeyGen status poller stopped: {e}")
+            raise
+
+    async def _poll(self, tracked: _TrackedVideo):
+        video_id = tracked.video_id
+        if time.monotonic() - tracked.started_at > HEYGEN_RENDER_TIMEOUT:
+            self.fail(video_id, "Video generation timed out")
+            return
+
+        tracked.polls += 1
+        self.total_polls += 1
+        try:
+            status = await tracked.fetch_status(video_id)
+            tracked.errors = 0
+        except Exception as e:
+            tracked.errors += 1
+            if tracked.errors >= HEYGEN_MAX_POLL_ERRORS:
+                self.fail(video_id, str(e))
+                return
+            status = {"status": "processing"}
+
+        if status["status"] == "completed":
+            self.complete(video_id, status)
+        elif status["status"] == "failed":
+            self.fail(video_id, f"Video generation failed: {status.get('error') or 'Unknown error'}")
+        elif status["status"] in ["pending", "processing", "waiting"]:
+            tracked.next_poll_at = time.monotonic() + self._next_interval(tracked)
+        else:
+            self.fail(video_id, f"Unknown video status: {status['status']}")
+
+
+heygen_poller = HeyGenStatusPoller()
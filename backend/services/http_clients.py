@@ -0,0 +1,58 @@
+import importlib.util
+import os
+import httpx
+from typing import Dict
+
+# Per-provider connection settings. HTTP/2 is only negotiated where the
+# provider supports it and the optional h2 package is installed.
+PROVIDERS = {
+    "heygen": {"http2": False},
+    "veo": {"http2": True},
+    "elevenlabs": {"http2": True},
+    # Downloads of rendered assets from provider CDNs (HeyGen videos, DALL-E images)
+    "media": {"http2": False},
+}
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def _setting(provider: str, name: str, default):
+    """Read a per-provider override such as HEYGEN_HTTP_MAX_CONNECTIONS, falling back to the global default."""
+    value = os.getenv(f"{provider.upper()}_{name}")
+    return type(default)(value) if value is not None else default
+
+
+def get_client(provider: str) -> httpx.AsyncClient:
+    """
+    Return the app-lifetime pooled client for a provider, creating it on first use.
+    """
+    if provider not in PROVIDERS:
+        raise ValueError(f"Unknown HTTP provider: {provider}")
+
+    client = _clients.get(provider)
+    if client is None or client.is_closed:
+        limits = httpx.Limits(
+            max_connections=_setting(provider, "HTTP_MAX_CONNECTIONS", HTTP_MAX_CONNECTIONS),
+            max_keepalive_connections=_setting(
+                provider, "HTTP_MAX_KEEPALIVE_CONNECTIONS", HTTP_MAX_KEEPALIVE_CONNECTIONS
+            ),
+            keepalive_expiry=_setting(provider, "HTTP_KEEPALIVE_EXPIRY", HTTP_KEEPALIVE_EXPIRY),
+        )
+        client = httpx.AsyncClient(
+            limits=limits,
+            http2=PROVIDERS[provider]["http2"] and HTTP2_AVAILABLE,
+            timeout=30.0,
+        )
+        _clients[provider] = client
+    return client
+
+
+async def close_clients():
+    for client in _clients.values():
+        await client.aclose()
+    _clients.clear()
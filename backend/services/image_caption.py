@@ -1,13 +1,355 @@
 # backend/services/image_caption.py
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
 from PIL import Image
-from transformers import BlipProcessor, BlipForConditionalGeneration
+from services.cache import TieredCache
+from services.video_frame import KEYFRAME_MAX_FRAMES, extract_keyframes
 
-processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
-model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-base")
+CAPTION_MODEL = os.getenv("CAPTION_MODEL", "Salesforce/blip-image-captioning-base")
+# torch (fp32), int8 (dynamically quantized Linear layers), onnx (ONNX Runtime vision
+# encoder with the torch text decoder) or onnx-int8 (ONNX encoder + int8 decoder)
+CAPTION_BACKEND = os.getenv("CAPTION_BACKEND", "torch")
+CAPTION_BACKENDS = ["torch", "int8", "onnx", "onnx-int8"]
+CAPTION_ONNX_DIR = os.getenv("CAPTION_ONNX_DIR", "cache/onnx")
+CAPTION_MAX_BATCH = int(os.getenv("CAPTION_MAX_BATCH", "8"))
+CAPTION_BATCH_WAIT_MS = float(os.getenv("CAPTION_BATCH_WAIT_MS", "25"))
+CAPTION_WARMUP = os.getenv("CAPTION_WARMUP", "0") == "1"
+# Inference runs in a pool of worker processes; 0 runs it in a thread of the app process instead
+CAPTION_WORKERS = int(os.getenv("CAPTION_WORKERS", "1"))
+CAPTION_TORCH_THREADS = int(os.getenv("CAPTION_TORCH_THREADS", str(max(1, (os.cpu_count() or 1) // max(1, CAPTION_WORKERS)))))
+CAPTION_MAX_PENDING = int(os.getenv("CAPTION_MAX_PENDING", "32"))
+CAPTION_TIMEOUT_SECONDS = float(os.getenv("CAPTION_TIMEOUT_SECONDS", "20"))
+
+caption_cache = TieredCache(
+    "captions",
+    memory_entries=int(os.getenv("CAPTION_CACHE_MEMORY_ENTRIES", "1024")),
+    disk_dir=os.getenv("CAPTION_CACHE_DIR", "cache/captions")
+)
+
+_models: Dict[str, tuple] = {}
+_load_lock = threading.Lock()
+
+def _export_vision_encoder(model, onnx_path: str):
+    """Export BLIP's vision encoder to ONNX (once) so ONNX Runtime can run it."""
+    import inspect
+    import torch
+
+    class VisionEncoder(torch.nn.Module):
+        def __init__(self, vision_model):
+            super().__init__()
+            self.vision_model = vision_model
+
+        def forward(self, pixel_values):
+            return self.vision_model(pixel_values=pixel_values, return_dict=False)[0]
+
+    os.makedirs(os.path.dirname(onnx_path), exist_ok=True)
+    size = model.config.vision_config.image_size
+    tmp_path = f"{onnx_path}.{os.getpid()}.tmp"
+    torch.onnx.export(
+        VisionEncoder(model.vision_model),
+        torch.zeros(1, 3, size, size),
+        tmp_path,
+        input_names=["pixel_values"],
+        output_names=["last_hidden_state"],
+        dynamic_axes={"pixel_values": {0: "batch"}, "last_hidden_state": {0: "batch"}},
+        opset_version=14,
+        # Newer torch defaults to the dynamo exporter; keep the TorchScript one for a plain graph
+        **({"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {})
+    )
+    os.replace(tmp_path, onnx_path)
+
+def _onnx_vision_model(onnx_path: str, torch_threads: int):
+    """Drop-in replacement for model.vision_model backed by an ONNX Runtime session."""
+    import onnxruntime
+    import torch
+
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = torch_threads
+    session = onnxruntime.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+
+    class OnnxVisionModel(torch.nn.Module):
+        def forward(self, pixel_values, **kwargs):
+            (hidden_state,) = session.run(None, {"pixel_values": pixel_values.detach().cpu().numpy()})
+            return (torch.from_numpy(hidden_state),)
+
+    return OnnxVisionModel()
+
+def load_model(backend: str = CAPTION_BACKEND):
+    """Load the BLIP processor and model for a backend on first use."""
+    if backend not in CAPTION_BACKENDS:
+        raise ValueError(f"Unknown caption backend: {backend}")
+    with _load_lock:
+        if backend not in _models:
+            import torch
+            from transformers import BlipProcessor, BlipForConditionalGeneration
+            processor = BlipProcessor.from_pretrained(CAPTION_MODEL)
+            model = BlipForConditionalGeneration.from_pretrained(CAPTION_MODEL).eval()
+            if backend.startswith("onnx"):
+                onnx_path = os.path.join(CAPTION_ONNX_DIR, CAPTION_MODEL.replace("/", "--"), "vision_encoder.onnx")
+                if not os.path.exists(onnx_path):
+                    _export_vision_encoder(model, onnx_path)
+                model.vision_model = _onnx_vision_model(onnx_path, torch.get_num_threads())
+            if backend.endswith("int8"):
+                model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            _models[backend] = (processor, model)
+    return _models[backend]
+
+def caption_images(images: List[bytes], backend: str = CAPTION_BACKEND) -> List[str]:
+    """Caption a batch of encoded images with a single generate call."""
+    import torch
+    processor, model = load_model(backend)
+    raw_images = [Image.open(io.BytesIO(data)).convert('RGB') for data in images]
+    inputs = processor(raw_images, return_tensors="pt")
+    with torch.inference_mode():
+        out = model.generate(**inputs)
+    return [processor.decode(tokens, skip_special_tokens=True) for tokens in out]
+
+def _init_worker(torch_threads: int):
+    """Process pool initializer: pin torch's thread count and load the model once per worker."""
+    import torch
+    torch.set_num_threads(torch_threads)
+    load_model()
+
+def _cache_key(content_hash: str) -> str:
+    return TieredCache.make_key(CAPTION_MODEL, CAPTION_BACKEND, content_hash)
 
 def get_image_caption(image_path: str) -> str:
-    raw_image = Image.open(image_path).convert('RGB')
-    inputs = processor(raw_image, return_tensors="pt")
-    out = model.generate(**inputs)
-    caption = processor.decode(out[0], skip_special_tokens=True)
+    with open(image_path, "rb") as f:
+        data = f.read()
+    key = _cache_key(hashlib.sha256(data).hexdigest())
+    caption = caption_cache.get(key)
+    if caption is None:
+        caption = caption_images([data])[0]
+        caption_cache.set(key, caption)
     return caption
+
+class CaptionBatcher:
+    """
+    Coalesces concurrent caption requests into micro-batches.
+
+    The first request opens a batch window of CAPTION_BATCH_WAIT_MS; requests
+    arriving within it (up to CAPTION_MAX_BATCH) share one inference call that
+    runs in the caption process pool. Up to CAPTION_WORKERS batches run at once;
+    while every worker is busy the next batch keeps filling. Identical images in
+    flight share a single slot.
+
+    Callers get None instead of waiting when CAPTION_MAX_PENDING images are
+    already queued or the caption takes longer than CAPTION_TIMEOUT_SECONDS.
+    """
+
+    def __init__(
+        self,
+        max_batch: int = CAPTION_MAX_BATCH,
+        wait_ms: float = CAPTION_BATCH_WAIT_MS,
+        workers: int = CAPTION_WORKERS,
+        max_pending: int = CAPTION_MAX_PENDING,
+        timeout: float = CAPTION_TIMEOUT_SECONDS
+    ):
+        self.max_batch = max(1, max_batch)
+        self.wait_seconds = wait_ms / 1000
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # One slot per worker (a single thread when workers is 0)
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._batch_tasks = set()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.batches = 0
+        self.images = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    async def caption(self, data: bytes, content_hash: str) -> Optional[str]:
+        future = self._in_flight.get(content_hash)
+        if future is None:
+            if len(self._in_flight) >= self.max_pending:
+                self.rejected += 1
+                return None
+            self._ensure_running()
+            future = asyncio.get_running_loop().create_future()
+            # Mark errors as retrieved in case every waiter already timed out
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self._in_flight[content_hash] = future
+            self._queue.put_nowait((content_hash, data, future))
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            return None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "batches": self.batches,
+            "images": self.images,
+            "pending": len(self._in_flight),
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+        }
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Let batches already handed to the workers finish before the pool goes away
+        await asyncio.gather(*self._batch_tasks, return_exceptions=True)
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _ensure_running(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(max(1, self.workers))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                # spawn, not fork: the app process has a running event loop and threads
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(CAPTION_TORCH_THREADS,)
+            )
+        return self._pool
+
+    async def _infer(self, images: List[bytes]) -> List[str]:
+        if self.workers <= 0:
+            return await asyncio.to_thread(caption_images, images)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._get_pool(), caption_images, images)
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool for the next batch
+            self._pool = None
+            raise
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Wait for a free worker before opening the batch window
+            await self._slots.acquire()
+            try:
+                batch = [await self._queue.get()]
+                deadline = loop.time() + self.wait_seconds
+                while len(batch) < self.max_batch:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+            except BaseException:
+                self._slots.release()
+                raise
+            task = asyncio.create_task(self._process(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_done)
+
+    def _batch_done(self, task: asyncio.Task):
+        self._batch_tasks.discard(task)
+        self._slots.release()
+
+    async def _process(self, batch: list):
+        self.batches += 1
+        self.images += len(batch)
+        try:
+            captions = await self._infer([data for _, data, _ in batch])
+        except Exception as e:
+            self.failures += 1
+            captions = [e] * len(batch)
+        for (content_hash, _, future), caption in zip(batch, captions):
+            self._in_flight.pop(content_hash, None)
+            if not isinstance(caption, Exception):
+                # Cache even if every waiter timed out, so the next request is a hit
+                caption_cache.set(_cache_key(content_hash), caption)
+            if future.done():
+                continue
+            if isinstance(caption, Exception):
+                future.set_exception(caption)
+            else:
+                future.set_result(caption)
+
+caption_batcher = CaptionBatcher()
+
+async def caption_image(image_path: str, content_hash: Optional[str] = None) -> Optional[str]:
+    """
+    Caption an image file without blocking the event loop.
+    Results are cached by image content hash, so the same image is never inferred twice;
+    pass the asset's blob hash to skip reading the file on a cache hit.
+    Returns None when the caption workers are saturated or too slow.
+    """
+    if content_hash:
+        caption = caption_cache.get(_cache_key(content_hash))
+        if caption is not None:
+            return caption
+    data, content_hash = await asyncio.to_thread(_read_image, image_path, content_hash)
+    return await caption_image_bytes(data, content_hash)
+
+def _read_image(image_path: str, content_hash: Optional[str]) -> Tuple[bytes, str]:
+    with open(image_path, "rb") as f:
+        data = f.read()
+    return data, content_hash or hashlib.sha256(data).hexdigest()
+
+async def caption_image_bytes(data: bytes, content_hash: Optional[str] = None) -> Optional[str]:
+    content_hash = content_hash or hashlib.sha256(data).hexdigest()
+    caption = caption_cache.get(_cache_key(content_hash))
+    if caption is None:
+        caption = await caption_batcher.caption(data, content_hash)
+    return caption
+
+async def warm_up():
+    """Load the model ahead of the first caption request."""
+    if CAPTION_WORKERS <= 0:
+        await asyncio.to_thread(load_model)
+        return
+    # Starting every worker runs the initializer, which loads the model
+    pool = caption_batcher._get_pool()
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(loop.run_in_executor(pool, os.getpid) for _ in range(CAPTION_WORKERS)))
+
+def _join_captions(keyframes: List[Dict], captions: List[Optional[str]]) -> Optional[str]:
+    parts = []
+    last_caption = None
+    for frame, caption in zip(keyframes, captions):
+        if caption and caption != last_caption:
+            parts.append(f"at {frame['timestamp']:g}s {caption}")
+            last_caption = caption
+    return "; ".join(parts) or None
+
+async def describe_video(video_path: str, content_hash: Optional[str] = None) -> Optional[str]:
+    """
+    Extract keyframes from a video, caption them together (they land in one
+    micro-batch) and join them into a single time-ordered description. With the
+    video's blob hash the description is cached, so a video seen in any earlier
+    session skips frame extraction and captioning entirely.
+    """
+    key = None
+    if content_hash:
+        key = TieredCache.make_key(CAPTION_MODEL, CAPTION_BACKEND, "video", KEYFRAME_MAX_FRAMES, content_hash)
+        description = caption_cache.get(key)
+        if description is not None:
+            return description
+    keyframes = await asyncio.to_thread(extract_keyframes, video_path)
+    captions = await asyncio.gather(*(caption_image_bytes(frame["image"]) for frame in keyframes))
+    description = _join_captions(keyframes, captions)
+    # Not cached when a frame caption was skipped, so a later request can fill it in
+    if key and description and all(caption is not None for caption in captions):
+        caption_cache.set(key, description)
+    return description
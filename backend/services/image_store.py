@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import io
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from PIL import Image, ImageOps
+from services.session_store import UPLOAD_DIR
+
+try:
+    # AVIF support for Pillow < 11.2 comes from this plugin when it is installed
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+IMAGE_STORE_DIR = os.getenv("IMAGE_STORE_DIR", os.path.join(UPLOAD_DIR, "images"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+IMAGE_ID_LENGTH = 16
+
+# Derivative sizes: thumbnails are fitted inside the box, ad placements are cropped to fill it
+IMAGE_VARIANTS = {
+    "thumb": {"size": (320, 320), "crop": False},
+    "square": {"size": (1080, 1080), "crop": True},
+    "portrait": {"size": (1080, 1350), "crop": True},
+    "story": {"size": (1080, 1920), "crop": True},
+    "landscape": {"size": (1200, 628), "crop": True},
+}
+IMAGE_FORMATS = {
+    "webp": {"format": "WEBP", "options": {"quality": 82, "method": 4}},
+    "avif": {"format": "AVIF", "options": {"quality": 60}},
+    "jpeg": {"format": "JPEG", "options": {"quality": 85, "optimize": True, "progressive": True}},
+    "png": {"format": "PNG", "options": {"optimize": True}},
+}
+
+IMAGE_ID = re.compile(rf"^[0-9a-f]{{{IMAGE_ID_LENGTH}}}$")
+
+
+class ImageNotFoundError(Exception):
+    pass
+
+
+def image_urls(image_id: str) -> Dict[str, str]:
+    """URLs of a stored image and its thumbnail on the image endpoint."""
+    return {
+        "image_url": f"/image/{image_id}",
+        "thumbnail_url": f"/image/{image_id}?variant=thumb&format=webp",
+    }
+
+
+def format_supported(fmt: str) -> bool:
+    return fmt in IMAGE_FORMATS and f".{fmt}" in Image.registered_extensions()
+
+
+def render_derivative(source_path: str, dest_path: str, variant: Optional[str], fmt: str):
+    """Resize and encode one derivative; runs in the image thread pool."""
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        if variant:
+            spec = IMAGE_VARIANTS[variant]
+            if spec["crop"]:
+                image = ImageOps.fit(image, spec["size"], Image.LANCZOS)
+            else:
+                image = image.copy()
+                image.thumbnail(spec["size"], Image.LANCZOS)
+        settings = IMAGE_FORMATS[fmt]
+        if settings["format"] == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, settings["format"], **settings["options"])
+
+    tmp_path = f"{dest_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(buffer.getvalue())
+    os.replace(tmp_path, dest_path)
+
+
+class ImageStore:
+    """
+    Generated images, stored as files under a short content-derived ID.
+
+    Originals live at images/<id>.<ext>. Derivatives (thumbnails and ad-placement
+    sizes as WebP/AVIF/JPEG/PNG) are rendered on first request in a thread pool
+    and kept under images/derived/, so later requests are plain file reads.
+    Concurrent requests for the same derivative share one render.
+    """
+
+    def __init__(self, store_dir: str = IMAGE_STORE_DIR, workers: int = IMAGE_WORKERS):
+        self.store_dir = store_dir
+        self.derived_dir = os.path.join(store_dir, "derived")
+        os.makedirs(self.derived_dir, exist_ok=True)
+        self.workers = max(1, workers)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.stored = 0
+        self.derivatives_rendered = 0
+        self.derivative_hits = 0
+
+    def save(self, data: bytes, ext: str = "png") -> str:
+        """Store image bytes and return their ID; identical images share an ID."""
+        image_id = hashlib.sha256(data).hexdigest()[:IMAGE_ID_LENGTH]
+        path = os.path.join(self.store_dir, f"{image_id}.{ext}")
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self.stored += 1
+        return image_id
+
+    def original_path(self, image_id: str) -> str:
+        if IMAGE_ID.match(image_id):
+            for ext in ("png", "jpeg", "webp"):
+                path = os.path.join(self.store_dir, f"{image_id}.{ext}")
+                if os.path.exists(path):
+                    return path
+        raise ImageNotFoundError(f"Image {image_id} not found")
+
+    async def derivative_path(self, image_id: str, variant: Optional[str], fmt: str) -> str:
+        """
+        Path of an image resized to variant (None keeps the original size) and
+        encoded as fmt, rendering it first if it is not cached yet.
+        """
+        if variant is not None and variant not in IMAGE_VARIANTS:
+            raise ValueError(f"variant must be one of {', '.join(IMAGE_VARIANTS)}")
+        if not format_supported(fmt):
+            raise ValueError(f"format must be one of {', '.join(f for f in IMAGE_FORMATS if format_supported(f))}")
+        source_path = self.original_path(image_id)
+        dest_path = os.path.join(self.derived_dir, f"{image_id}_{variant or 'full'}.{fmt}")
+        if os.path.exists(dest_path):
+            self.derivative_hits += 1
+            return dest_path
+
+        future = self._in_flight.get(dest_path)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._get_pool(), render_derivative, source_path, dest_path, variant, fmt)
+            self._in_flight[dest_path] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(dest_path, None))
+            self.derivatives_rendered += 1
+        await asyncio.shield(future)
+        return dest_path
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "stored": self.stored,
+            "derivatives_rendered": self.derivatives_rendered,
+            "derivative_hits": self.derivative_hits,
+            "rendering": len(self._in_flight),
+        }
+
+    def stop(self):
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="image")
+        return self._pool
+
+
+image_store = ImageStore()
@@ -0,0 +1,168 @@
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+COMBINED_VIDEO_WORKERS = int(os.getenv("COMBINED_VIDEO_WORKERS", "2"))
+COMBINED_VIDEO_QUEUE_SIZE = int(os.getenv("COMBINED_VIDEO_QUEUE_SIZE", "50"))
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class Job:
+    """State of one background job, as reported by the status endpoint."""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.status = "queued"
+        self.stage: Optional[str] = None
+        self.artifacts: Dict[str, str] = {}
+        self.preview: Optional[str] = None
+        self.metrics: Dict[str, Any] = {}
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def set_stage(self, stage: str):
+        self.stage = stage
+
+    def add_artifact(self, name: str, path: str):
+        self.artifacts[name] = path
+
+    def set_preview(self, path: str):
+        """Record a playable preview, available before the job finishes."""
+        self.preview = path
+
+    def record_metric(self, name: str, value: Any):
+        self.metrics[name] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "stage": self.stage,
+            "artifacts": dict(self.artifacts),
+            "preview_ready": self.preview is not None,
+            "preview": self.preview,
+            "metrics": dict(self.metrics),
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """
+    Bounded queue of async jobs drained by a fixed number of worker tasks.
+    """
+
+    def __init__(self, workers: int, maxsize: int):
+        self.workers = max(1, workers)
+        self.maxsize = maxsize
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: list = []
+        self._jobs: Dict[str, Job] = {}
+
+    def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def submit(self, job_id: str, func: Callable[[Job], Awaitable[Dict[str, Any]]]) -> Job:
+        """Queue func(job) for execution. Raises QueueFullError when the queue is at capacity."""
+        self.start()
+        self._prune()
+        job = Job(job_id)
+        try:
+            self._queue.put_nowait((job, func))
+        except asyncio.QueueFull:
+            raise QueueFullError("Job queue is full, try again later")
+        self._jobs[job_id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a queued or running job. A running job's task is cancelled, which
+        also kills any FFmpeg process it is waiting on. Returns False if the job
+        is unknown or already finished.
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.status not in ("queued", "running"):
+            return False
+        job.status = "cancelled"
+        job.error = "Job cancelled"
+        if job._task:
+            job._task.cancel()
+        else:
+            # Still queued: the worker skips it when dequeued
+            job.finished_at = time.time()
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        counts = {"queued": 0, "running": 0, "done": 0, "failed": 0, "cancelled": 0}
+        for job in self._jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "workers": self.workers,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            **counts,
+        }
+
+    async def _worker(self):
+        while True:
+            job, func = await self._queue.get()
+            if job.status == "cancelled":
+                self._queue.task_done()
+                continue
+            job.status = "running"
+            job.started_at = time.time()
+            # Run in its own task so cancelling the job does not stop the worker
+            job._task = asyncio.create_task(func(job))
+            try:
+                job.result = await job._task
+                job.status = "done"
+            except asyncio.CancelledError:
+                if job.status != "cancelled":
+                    # The worker itself is being stopped
+                    job._task.cancel()
+                    job.status = "failed"
+                    job.error = "Job cancelled"
+                    raise
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                job._task = None
+                job.finished_at = time.time()
+                self._queue.task_done()
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+combined_video_queue = JobQueue(COMBINED_VIDEO_WORKERS, COMBINED_VIDEO_QUEUE_SIZE)
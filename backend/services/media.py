@@ -0,0 +1,156 @@
+import hashlib
+import mimetypes
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Mapping, Optional, Tuple
+from fastapi.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+MEDIA_CHUNK_SIZE = int(os.getenv("MEDIA_CHUNK_SIZE", str(256 * 1024)))
+# Browsers may reuse a file this long before revalidating it with its ETag
+MEDIA_CACHE_SECONDS = int(os.getenv("MEDIA_CACHE_SECONDS", "3600"))
+ZERO_COPY_EXTENSION = "http.response.zerocopysend"
+
+BYTE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# HLS types are missing from some systems' mime.types
+mimetypes.add_type("application/vnd.apple.mpegurl", ".m3u8")
+mimetypes.add_type("video/iso.segment", ".m4s")
+
+
+def media_url(session_id: str, path: str) -> str:
+    """URL of a session artifact on the media endpoint."""
+    return f"/media/{session_id}/{os.path.basename(path)}"
+
+
+class MediaFileResponse(Response):
+    """
+    File response with single-range requests, ETag/Last-Modified validators and
+    conditional GETs, so videos are seekable and unchanged files are answered
+    with 304.
+
+    The body is handed to the server with the ASGI zero-copy send extension
+    (os.sendfile) when the server offers it, and streamed in chunks otherwise;
+    uvicorn does not offer it, so under uvicorn the body is always chunked.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        request_headers: Mapping[str, str],
+        method: str = "GET",
+        cache_control: Optional[str] = None
+    ):
+        self.path = path
+        self.background = None
+        self.send_header_only = method.upper() == "HEAD"
+        self.media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.init_headers({})
+
+        stat = os.stat(path)
+        self.size = stat.st_size
+        self.etag = '"{}"'.format(
+            hashlib.md5(f"{stat.st_mtime_ns}-{stat.st_size}".encode(), usedforsecurity=False).hexdigest()
+        )
+        self.last_modified = int(stat.st_mtime)
+        self.headers["etag"] = self.etag
+        self.headers["last-modified"] = formatdate(self.last_modified, usegmt=True)
+        self.headers["accept-ranges"] = "bytes"
+        self.headers["cache-control"] = cache_control or f"private, max-age={MEDIA_CACHE_SECONDS}"
+
+        self.start, self.end = 0, self.size - 1
+        if self._not_modified(request_headers):
+            self.status_code = 304
+            self.send_header_only = True
+            del self.headers["content-type"]
+            return
+
+        byte_range = request_headers.get("range")
+        if byte_range and self._range_applies(request_headers.get("if-range")):
+            parsed = self._parse_range(byte_range)
+        else:
+            parsed = None
+        if parsed is None:
+            self.status_code = 200
+        elif parsed[0] > parsed[1]:
+            self.status_code = 416
+            self.send_header_only = True
+            self.headers["content-range"] = f"bytes */{self.size}"
+            self.headers["content-length"] = "0"
+            return
+        else:
+            self.start, self.end = parsed
+            self.status_code = 206
+            self.headers["content-range"] = f"bytes {self.start}-{self.end}/{self.size}"
+        self.headers["content-length"] = str(self.end - self.start + 1)
+
+    def _not_modified(self, request_headers: Mapping[str, str]) -> bool:
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            # Weak comparison, as required for If-None-Match
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or self.etag in tags
+        return self._not_newer_than(request_headers.get("if-modified-since"))
+
+    def _range_applies(self, if_range: Optional[str]) -> bool:
+        """A Range is honoured unless If-Range names another version of the file."""
+        if if_range is None:
+            return True
+        if if_range.startswith('"') or if_range.startswith("W/"):
+            return if_range == self.etag
+        return self._not_newer_than(if_range)
+
+    def _not_newer_than(self, http_date: Optional[str]) -> bool:
+        if not http_date:
+            return False
+        try:
+            return self.last_modified <= parsedate_to_datetime(http_date).timestamp()
+        except (TypeError, ValueError):
+            return False
+
+    def _parse_range(self, value: str) -> Optional[Tuple[int, int]]:
+        """
+        (start, end) of a single byte range, where start > end means it cannot be
+        satisfied. None means the header is ignored and the whole file is sent:
+        RFC 9110 asks for that on invalid syntax, and multi-range requests are
+        rare for media.
+        """
+        match = BYTE_RANGE.match(value.strip())
+        if not match:
+            return None
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            if last and int(last) < start:
+                return None
+            end = min(int(last), self.size - 1) if last else self.size - 1
+        elif last:
+            # Suffix range: the final N bytes
+            start, end = max(0, self.size - int(last)), self.size - 1
+        else:
+            return None
+        return start, end
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if self.send_header_only or self.size == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        count = self.end - self.start + 1
+        with open(self.path, "rb") as file:
+            if ZERO_COPY_EXTENSION in scope.get("extensions", {}):
+                await send({"type": ZERO_COPY_EXTENSION, "file": file, "offset": self.start, "count": count})
+                return
+
+            file.seek(self.start)
+            while count > 0:
+                chunk = await run_in_threadpool(file.read, min(MEDIA_CHUNK_SIZE, count))
+                if not chunk:
+                    break
+                count -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": count > 0})
+            if count > 0:
+                # File shrank underneath us; end the response rather than hang
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
@@ -0,0 +1,152 @@
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+CPU_COUNT = os.cpu_count() or 1
+# Concurrent FFmpeg renders; x264 keeps scaling to about 4 threads, so by default
+# cores are split into jobs of 4 threads rather than one job using every core
+RENDER_MAX_JOBS = int(os.getenv("RENDER_MAX_JOBS", str(max(1, CPU_COUNT // 4))))
+RENDER_THREADS_PER_JOB = int(os.getenv("RENDER_THREADS_PER_JOB", str(max(1, CPU_COUNT // RENDER_MAX_JOBS))))
+RENDER_MAX_QUEUE = int(os.getenv("RENDER_MAX_QUEUE", "100"))
+RENDER_TIMEOUT_SECONDS = float(os.getenv("RENDER_TIMEOUT_SECONDS", "300"))
+
+
+class RenderQueueFullError(Exception):
+    pass
+
+
+async def run_process(cmd: List[str], timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Run a command without blocking the event loop and return its returncode,
+    stdout and stderr. The process is killed if the caller is cancelled or the
+    timeout expires (which raises asyncio.TimeoutError).
+    """
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except BaseException:
+        # Cancelled or timed out: never leave FFmpeg running without an owner
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    return {
+        "returncode": process.returncode,
+        "stdout": stdout.decode(errors="replace"),
+        "stderr": stderr.decode(errors="replace"),
+    }
+
+
+class RenderScheduler:
+    """
+    Caps how many FFmpeg renders run at once and how many threads each may use,
+    so concurrent requests queue for a slot instead of oversubscribing the CPU.
+    """
+
+    def __init__(
+        self,
+        max_jobs: int = RENDER_MAX_JOBS,
+        threads_per_job: int = RENDER_THREADS_PER_JOB,
+        max_queue: int = RENDER_MAX_QUEUE,
+        timeout: float = RENDER_TIMEOUT_SECONDS
+    ):
+        self.max_jobs = max(1, max_jobs)
+        self.threads_per_job = max(1, threads_per_job)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(self.max_jobs)
+        self.queued = 0
+        self.running = 0
+        self.peak_queue_depth = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self._runs = 0
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+
+    def thread_args(self, outputs: int = 1) -> List[str]:
+        """
+        FFmpeg options that keep one render within its thread budget. A render
+        writing several outputs splits the encoder threads between them; pass
+        the result once per output.
+        """
+        return [
+            "-filter_complex_threads", str(self.threads_per_job),
+            "-threads", str(max(1, self.threads_per_job // max(1, outputs)))
+        ]
+
+    async def run(self, cmd: List[str], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Wait for a render slot, then run cmd. Raises RenderQueueFullError when
+        max_queue renders are already waiting. Cancelling the caller kills the
+        process, whether it is still queued or already running.
+        """
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise RenderQueueFullError("Render queue is full, try again later")
+
+        self.queued += 1
+        self.peak_queue_depth = max(self.peak_queue_depth, self.queued)
+        queued_at = time.monotonic()
+        try:
+            await self._semaphore.acquire()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            self.queued -= 1
+
+        wait_seconds = time.monotonic() - queued_at
+        self._runs += 1
+        self._wait_seconds += wait_seconds
+        self.running += 1
+        started = time.monotonic()
+        try:
+            result = await run_process(cmd, timeout or self.timeout)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.running -= 1
+            self._run_seconds += time.monotonic() - started
+            self._semaphore.release()
+
+        if result["returncode"] == 0:
+            self.completed += 1
+        else:
+            self.failed += 1
+        result["wait_seconds"] = round(wait_seconds, 3)
+        result["run_seconds"] = round(time.monotonic() - started, 3)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        runs = self._runs
+        return {
+            "max_jobs": self.max_jobs,
+            "threads_per_job": self.threads_per_job,
+            "queue_depth": self.queued,
+            "peak_queue_depth": self.peak_queue_depth,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "avg_wait_seconds": round(self._wait_seconds / runs, 3) if runs else 0.0,
+            "avg_run_seconds": round(self._run_seconds / runs, 3) if runs else 0.0,
+        }
+
+
+render_scheduler = RenderScheduler()
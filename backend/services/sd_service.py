@@ -1,16 +1,26 @@
 import os
+import asyncio
 import openai
 from dotenv import load_dotenv
-import base64
-import io
-from PIL import Image
+from typing import AsyncIterator, Dict, List
+from services.http_clients import get_client
+from services.image_store import image_store, image_urls
 
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY_IMG")
 
-def generate_image(prompt: str, size: str = "1024x1024", quality: str = "standard") -> str:
+# Calls in flight per provider, shared by single and batch requests
+IMAGE_PROMPT_CONCURRENCY = int(os.getenv("IMAGE_PROMPT_CONCURRENCY", "4"))
+IMAGE_GENERATION_CONCURRENCY = int(os.getenv("IMAGE_GENERATION_CONCURRENCY", "3"))
+IMAGE_BATCH_MAX_VARIANTS = int(os.getenv("IMAGE_BATCH_MAX_VARIANTS", "8"))
+
+_prompt_slots = asyncio.Semaphore(IMAGE_PROMPT_CONCURRENCY)
+_generation_slots = asyncio.Semaphore(IMAGE_GENERATION_CONCURRENCY)
+
+async def generate_image(prompt: str, size: str = "1024x1024", quality: str = "standard") -> str:
     """
-    Generate an image using DALL-E 3 with the given prompt.
+    Generate an image using DALL-E 3 with the given prompt and return its ID in
+    the image store.
     
     Args:
         prompt: The image generation prompt
@@ -18,30 +28,28 @@ def generate_image(prompt: str, size: str = "1024x1024", quality: str = "standar
         quality: Image quality (standard, hd)
     """
     try:
-        response = openai.images.generate(
-            model="dall-e-3",
-            prompt=prompt,
-            size=size,
-            quality=quality,
-            n=1,
-        )
+        async with _generation_slots:
+            response = await asyncio.to_thread(
+                openai.images.generate,
+                model="dall-e-3",
+                prompt=prompt,
+                size=size,
+                quality=quality,
+                n=1,
+            )
         
         image_url = response.data[0].url
         
-        import httpx
-        with httpx.Client(timeout=30.0) as client:
-            image_response = client.get(image_url)
-            image_response.raise_for_status()
-            image_bytes = image_response.content
-            
-            image_base64 = base64.b64encode(image_bytes).decode('utf-8')
-            return f"data:image/png;base64,{image_base64}"
+        image_response = await get_client("media").get(image_url, timeout=30.0)
+        image_response.raise_for_status()
+        return await asyncio.to_thread(image_store.save, image_response.content)
             
     except Exception as e:
         raise Exception(f"DALL-E 3 image generation failed: {str(e)}")
 
-def generate_image_with_prompt_optimization(user_input: str, style: str = "realistic", 
-                                          tone: str = "professional", size: str = "1024x1024") -> dict:
+async def generate_image_with_prompt_optimization(user_input: str, style: str = "realistic", 
+                                          tone: str = "professional", size: str = "1024x1024",
+                                          fresh: bool = False) -> dict:
     """
     Generate an image by first optimizing the prompt with GPT-3.5, then generating the image.
     
@@ -50,17 +58,55 @@ def generate_image_with_prompt_optimization(user_input: str, style: str = "reali
         style: Visual style (realistic, artistic, minimalist, etc.)
         tone: Tone/mood (professional, fun, luxury, etc.)
         size: Image size for generation
+        fresh: Skip the completion cache for the prompt optimization step
     """
     from .gpt_service import generate_image_prompt
     
     try:
-        optimized_prompt = generate_image_prompt(user_input, style, tone, model="gpt-3.5-turbo")
-        image_data = generate_image(optimized_prompt, size)
+        async with _prompt_slots:
+            optimized_prompt = await asyncio.to_thread(
+                generate_image_prompt, user_input, style, tone, model="gpt-3.5-turbo", fresh=fresh
+            )
+        image_id = await generate_image(optimized_prompt, size)
         
         return {
-            "image_data": image_data,
+            "image_id": image_id,
+            **image_urls(image_id),
             "optimized_prompt": optimized_prompt,
             "original_input": user_input
         }
     except Exception as e:
-        raise Exception(f"Image generation with prompt optimization failed: {str(e)}")
\ No newline at end of file
+        raise Exception(f"Image generation with prompt optimization failed: {str(e)}")
+
+async def generate_image_variants(user_input: str, variants: List[Dict[str, str]],
+                                  size: str = "1024x1024", fresh: bool = False) -> AsyncIterator[dict]:
+    """
+    Generate one image per style/tone variant concurrently and yield each result
+    as soon as it is ready, in completion order. A failed variant yields its
+    error instead of stopping the others. Closing the iterator early cancels the
+    variants still running.
+    
+    Args:
+        user_input: User's description of what they want
+        variants: Dicts with "style" and "tone"
+        size: Image size for generation
+        fresh: Skip the completion cache for the prompt optimization step
+    """
+    async def run(index: int, variant: Dict[str, str]) -> dict:
+        result = {"index": index, "style": variant["style"], "tone": variant["tone"]}
+        try:
+            result.update(await generate_image_with_prompt_optimization(
+                user_input, variant["style"], variant["tone"], size, fresh=fresh
+            ))
+        except Exception as e:
+            result["error"] = str(e)
+        return result
+
+    tasks = [asyncio.create_task(run(index, variant)) for index, variant in enumerate(variants)]
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            yield await next_result
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
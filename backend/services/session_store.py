@@ -0,0 +1,192 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", os.path.join(UPLOAD_DIR, "sessions.db"))
+
+# Session IDs become directory names, so only plain identifier characters are allowed
+SESSION_ID = re.compile(r"[A-Za-z0-9_-]+")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    product_json TEXT,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS assets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    original_name TEXT,
+    path TEXT NOT NULL,
+    size INTEGER,
+    sha256 TEXT,
+    created_at REAL NOT NULL,
+    UNIQUE (session_id, name)
+);
+CREATE INDEX IF NOT EXISTS idx_assets_session_kind ON assets (session_id, kind);
+CREATE INDEX IF NOT EXISTS idx_assets_sha256 ON assets (sha256);
+"""
+
+
+def check_session_id(session_id: str) -> str:
+    """Return session_id, or raise ValueError if it cannot safely name a session directory."""
+    if not isinstance(session_id, str) or not SESSION_ID.fullmatch(session_id):
+        raise ValueError("Invalid session_id: only letters, digits, '-' and '_' are allowed")
+    return session_id
+
+
+class SessionStore:
+    """
+    SQLite index of sessions and their assets.
+
+    Every session gets its own directory (uploads/sessions/<2-char fan-out>/<session_id>/),
+    and the index maps session -> product info and session -> assets by kind, so
+    lookups never scan the uploads directory.
+    """
+
+    def __init__(self, db_path: str = SESSION_DB_PATH, upload_dir: str = UPLOAD_DIR):
+        self.upload_dir = upload_dir
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def session_dir(self, session_id: str) -> str:
+        check_session_id(session_id)
+        path = os.path.join(self.upload_dir, "sessions", session_id[:2], session_id)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def asset_path(self, session_id: str, name: str) -> str:
+        """Path for a new asset file inside the session directory."""
+        path = os.path.join(self.session_dir(session_id), os.path.basename(name))
+        # Asset files can be hardlinks into the blob store; unlink an existing one so
+        # the writer creates a fresh file instead of truncating the shared blob
+        if os.path.isfile(path) and os.stat(path).st_nlink > 1:
+            os.remove(path)
+        return path
+
+    def create_session(self, session_id: str, product_info: Optional[Dict[str, Any]] = None, commit: bool = True):
+        check_session_id(session_id)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO sessions (session_id, product_json, created_at) VALUES (?, ?, ?)",
+                (session_id, None, time.time())
+            )
+            if product_info is not None:
+                self._conn.execute(
+                    "UPDATE sessions SET product_json = ? WHERE session_id = ?",
+                    (json.dumps(product_info), session_id)
+                )
+            if commit:
+                self._conn.commit()
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "session_id": row["session_id"],
+            "product": json.loads(row["product_json"]) if row["product_json"] else None,
+            "created_at": row["created_at"],
+            "assets": self.get_assets(session_id),
+        }
+
+    def get_product_info(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT product_json FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return json.loads(row["product_json"]) if row and row["product_json"] else None
+
+    def add_asset(
+        self,
+        session_id: str,
+        kind: str,
+        path: str,
+        original_name: Optional[str] = None,
+        sha256: Optional[str] = None,
+        commit: bool = True
+    ):
+        """Register (or replace) the asset file at path under its file name."""
+        check_session_id(session_id)
+        size = os.path.getsize(path) if os.path.exists(path) else None
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO sessions (session_id, product_json, created_at) VALUES (?, NULL, ?)",
+                (session_id, now)
+            )
+            self._conn.execute(
+                """
+                INSERT INTO assets (session_id, kind, name, original_name, path, size, sha256, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (session_id, name) DO UPDATE SET
+                    kind = excluded.kind,
+                    original_name = excluded.original_name,
+                    path = excluded.path,
+                    size = excluded.size,
+                    sha256 = excluded.sha256
+                """,
+                (session_id, kind, os.path.basename(path), original_name, path, size, sha256, now)
+            )
+            if commit:
+                self._conn.commit()
+
+    def get_assets(self, session_id: str, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        query = "SELECT * FROM assets WHERE session_id = ?"
+        params: tuple = (session_id,)
+        if kind:
+            query += " AND kind = ?"
+            params += (kind,)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY id", params).fetchall()
+        return [
+            {key: row[key] for key in ("kind", "name", "original_name", "path", "size", "sha256", "created_at")}
+            for row in rows
+        ]
+
+    def get_all_assets(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM assets ORDER BY id").fetchall()
+        return [dict(row) for row in rows]
+
+    def referenced_hashes(self) -> List[str]:
+        """Content hashes referenced by at least one asset (the blob store's live set)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT sha256 FROM assets WHERE sha256 IS NOT NULL"
+            ).fetchall()
+        return [row["sha256"] for row in rows]
+
+    def get_asset(self, session_id: str, kind: str) -> Optional[Dict[str, Any]]:
+        """Most recently registered asset of a kind."""
+        assets = self.get_assets(session_id, kind)
+        return assets[-1] if assets else None
+
+    def get_asset_by_name(self, session_id: str, name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM assets WHERE session_id = ? AND name = ?", (session_id, name)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+
+
+session_store = SessionStore()
@@ -1,12 +1,13 @@
 import os
 import httpx
 from dotenv import load_dotenv
+from services.http_clients import get_client
 
 load_dotenv()
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
 ELEVENLABS_VOICE_ID = "EXAVITQu4vr4xnSDxMaL"  # Default voice, change as needed
 
-def text_to_speech(text: str, voice_id: str = None) -> bytes:
+def _speech_request(text: str, voice_id: str = None) -> tuple:
     url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id or ELEVENLABS_VOICE_ID}"
     headers = {
         "xi-api-key": ELEVENLABS_API_KEY,
@@ -20,7 +21,26 @@ def text_to_speech(text: str, voice_id: str = None) -> bytes:
             "similarity_boost": 0.5
         }
     }
-    with httpx.Client(timeout=60.0) as client:
-        response = client.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        return response.content  # This is the audio (mp3) bytes
\ No newline at end of file
+    return url, headers, payload
+
+async def text_to_speech(text: str, voice_id: str = None) -> bytes:
+    url, headers, payload = _speech_request(text, voice_id)
+    response = await get_client("elevenlabs").post(url, headers=headers, json=payload, timeout=60.0)
+    response.raise_for_status()
+    return response.content  # This is the audio (mp3) bytes
+
+async def stream_text_to_speech(text: str, voice_id: str = None) -> httpx.Response:
+    """
+    Start synthesis on ElevenLabs' streaming endpoint, which sends MP3 audio as
+    it is generated. Returns the open response once the status is known; read
+    it with aiter_bytes() and aclose() it when done.
+    """
+    url, headers, payload = _speech_request(text, voice_id)
+    client = get_client("elevenlabs")
+    request = client.build_request("POST", f"{url}/stream", headers=headers, json=payload, timeout=60.0)
+    response = await client.send(request, stream=True)
+    if response.is_error:
+        body = await response.aread()
+        await response.aclose()
+        raise Exception(f"ElevenLabs streaming TTS failed with {response.status_code}: {body[:200].decode(errors='replace')}")
+    return response
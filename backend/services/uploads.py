@@ -0,0 +1,221 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, Optional
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from services.session_store import UPLOAD_DIR
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+MAX_UPLOAD_BYTES = {
+    "image": int(os.getenv("MAX_IMAGE_UPLOAD_BYTES", str(20 * 1024 * 1024))),
+    "video": int(os.getenv("MAX_VIDEO_UPLOAD_BYTES", str(1024 * 1024 * 1024))),
+    "voice": int(os.getenv("MAX_VOICE_UPLOAD_BYTES", str(50 * 1024 * 1024))),
+}
+PARTIAL_UPLOAD_DIR = os.path.join(UPLOAD_DIR, "partial")
+PARTIAL_UPLOAD_TTL_SECONDS = int(os.getenv("PARTIAL_UPLOAD_TTL_SECONDS", str(24 * 3600)))
+
+
+class UploadTooLargeError(Exception):
+    pass
+
+
+class UploadOffsetError(Exception):
+    def __init__(self, offset: int):
+        super().__init__(f"Chunk does not start at the current upload offset {offset}")
+        self.offset = offset
+
+
+class UploadRangeError(Exception):
+    pass
+
+
+async def save_upload(upload: UploadFile, dest_path: str, kind: str) -> Dict[str, Any]:
+    """
+    Stream an UploadFile to dest_path in fixed-size chunks, hashing as it goes.
+    Raises UploadTooLargeError (and removes the partial file) once the
+    size limit for kind is exceeded.
+    """
+    max_bytes = MAX_UPLOAD_BYTES[kind]
+    hasher = hashlib.sha256()
+    size = 0
+    part_path = dest_path + ".part"
+    try:
+        with open(part_path, "wb") as f:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(f"{kind} upload exceeds {max_bytes} bytes")
+                hasher.update(chunk)
+                await run_in_threadpool(f.write, chunk)
+        os.replace(part_path, dest_path)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+    return {"path": dest_path, "size": size, "sha256": hasher.hexdigest()}
+
+
+class ResumableUploads:
+    """
+    Chunked uploads that survive dropped connections.
+
+    Each upload keeps its metadata in partial/<upload_id>.json and its data in
+    partial/<upload_id>.part. The current offset is always the size of the part
+    file, so a client that lost its connection asks for the offset and continues
+    from there.
+    """
+
+    def __init__(self, directory: str = PARTIAL_UPLOAD_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        # upload_id -> (offset covered, running hash) for uploads appended by this process
+        self._hashers: Dict[str, tuple] = {}
+        # Serialises appends per upload, so two chunks sent for the same offset
+        # cannot both pass the offset check and interleave their writes
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def create(
+        self,
+        session_id: str,
+        kind: str,
+        filename: str,
+        size: int,
+        sha256: Optional[str] = None
+    ) -> Dict[str, Any]:
+        if kind not in MAX_UPLOAD_BYTES:
+            raise ValueError(f"Unknown upload kind: {kind}")
+        if size > MAX_UPLOAD_BYTES[kind]:
+            raise UploadTooLargeError(f"{kind} upload exceeds {MAX_UPLOAD_BYTES[kind]} bytes")
+        self._prune()
+
+        upload_id = uuid.uuid4().hex
+        state = {
+            "upload_id": upload_id,
+            "session_id": session_id,
+            "kind": kind,
+            "filename": os.path.basename(filename),
+            "size": size,
+            "sha256": sha256.lower() if sha256 else None,
+            "created_at": time.time(),
+        }
+        with open(self._state_path(upload_id), "w") as f:
+            json.dump(state, f)
+        open(self._part_path(upload_id), "wb").close()
+        self._hashers[upload_id] = (0, hashlib.sha256())
+        return {**state, "offset": 0}
+
+    def get(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._state_path(upload_id), "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return {**state, "offset": os.path.getsize(self._part_path(upload_id))}
+
+    async def append(
+        self,
+        upload_id: str,
+        start: int,
+        end: int,
+        total: Optional[int],
+        chunks: AsyncIterator[bytes]
+    ) -> Dict[str, Any]:
+        """
+        Append a streamed chunk covering bytes start..end (inclusive) of an upload
+        of total bytes (None when the client sent '*'). The chunk must begin at the
+        current offset and the body must be exactly as long as the range says;
+        a body of the wrong length is rolled back and UploadRangeError raised.
+        """
+        lock = self._locks.setdefault(upload_id, asyncio.Lock())
+        async with lock:
+            state = self.get(upload_id)
+            if state is None:
+                raise KeyError(upload_id)
+            if total is not None and total != state["size"]:
+                raise UploadRangeError(f"Content-Range total {total} does not match the declared size {state['size']}")
+            if end < start:
+                raise UploadRangeError("Content-Range end is before its start")
+            if end >= state["size"]:
+                raise UploadTooLargeError("Chunk runs past the declared upload size")
+            offset = state["offset"]
+            if start != offset:
+                raise UploadOffsetError(offset)
+
+            hashed_offset, hasher = self._hashers.get(upload_id, (None, None))
+            if hashed_offset != offset:
+                hasher = None
+            try:
+                with open(self._part_path(upload_id), "ab") as f:
+                    try:
+                        async for chunk in chunks:
+                            if offset + len(chunk) > end + 1:
+                                raise UploadRangeError("Request body is longer than its Content-Range")
+                            await run_in_threadpool(f.write, chunk)
+                            offset += len(chunk)
+                            if hasher:
+                                hasher.update(chunk)
+                        if offset != end + 1:
+                            raise UploadRangeError("Request body is shorter than its Content-Range")
+                    except UploadRangeError:
+                        await run_in_threadpool(f.truncate, start)
+                        offset, hasher = start, None
+                        raise
+            finally:
+                if hasher:
+                    self._hashers[upload_id] = (offset, hasher)
+                else:
+                    self._hashers.pop(upload_id, None)
+            return {**state, "offset": offset}
+
+    def finish(self, upload_id: str, dest_path: str) -> Dict[str, Any]:
+        """Verify a complete upload and move it to dest_path."""
+        state = self.get(upload_id)
+        if state is None or state["offset"] != state["size"]:
+            raise ValueError("Upload is not complete")
+
+        part_path = self._part_path(upload_id)
+        self._locks.pop(upload_id, None)
+        hashed_offset, hasher = self._hashers.pop(upload_id, (None, None))
+        if hashed_offset != state["size"]:
+            # This process did not see every chunk (e.g. it restarted); hash from disk
+            hasher = hashlib.sha256()
+            with open(part_path, "rb") as f:
+                for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+                    hasher.update(chunk)
+        sha256 = hasher.hexdigest()
+        if state["sha256"] and state["sha256"] != sha256:
+            self.discard(upload_id)
+            raise ValueError("Checksum mismatch, upload discarded")
+
+        os.replace(part_path, dest_path)
+        os.remove(self._state_path(upload_id))
+        return {"path": dest_path, "size": state["size"], "sha256": sha256}
+
+    def discard(self, upload_id: str):
+        self._hashers.pop(upload_id, None)
+        self._locks.pop(upload_id, None)
+        for path in (self._part_path(upload_id), self._state_path(upload_id)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _state_path(self, upload_id: str) -> str:
+        return os.path.join(self.directory, f"{os.path.basename(upload_id)}.json")
+
+    def _part_path(self, upload_id: str) -> str:
+        return os.path.join(self.directory, f"{os.path.basename(upload_id)}.part")
+
+    def _prune(self):
+        cutoff = time.time() - PARTIAL_UPLOAD_TTL_SECONDS
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".json") and entry.stat().st_mtime < cutoff:
+                    self.discard(entry.name[:-len(".json")])
+
+
+resumable_uploads = ResumableUploads()
@@ -1,31 +1,114 @@
 import os
-import httpx
+import re
+import json
 import base64
-import time
+import binascii
 from dotenv import load_dotenv
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, BinaryIO
+from services.http_clients import get_client
 
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 VEO_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/models/veo-3:generateContent"
+VEO_CHUNK_SIZE = 256 * 1024
+
+class _InlineDataExtractor:
+    """
+    Incremental parser for a Veo response body.
+
+    The base64 "data" string inside "inlineData" is decoded in chunks straight
+    into out_file. Everything else is kept as a small JSON skeleton with that
+    string emptied, so the response metadata can still be parsed at the end.
+    """
+
+    _DATA_VALUE = re.compile(rb'"inlineData"\s*:\s*\{[^{}]*"data"\s*:\s*$')
+
+    def __init__(self, out_file: BinaryIO):
+        self.out_file = out_file
+        self.skeleton = bytearray()
+        self.bytes_written = 0
+        self._in_string = False
+        self._escaped = False
+        self._in_payload = False
+        self._pending = b""
+
+    def feed(self, chunk: bytes):
+        i = 0
+        n = len(chunk)
+        while i < n:
+            if self._in_payload:
+                end = chunk.find(b'"', i)
+                self._decode(chunk[i:] if end == -1 else chunk[i:end])
+                if end == -1:
+                    return
+                self._finish_payload()
+                self.skeleton += b'"'
+                i = end + 1
+                continue
+
+            c = chunk[i]
+            self.skeleton.append(c)
+            i += 1
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif c == 0x5C:  # backslash
+                    self._escaped = True
+                elif c == 0x22:  # closing quote
+                    self._in_string = False
+            elif c == 0x22:
+                if self._DATA_VALUE.search(bytes(self.skeleton[-512:-1])):
+                    self._in_payload = True
+                else:
+                    self._in_string = True
+
+    def skeleton_json(self) -> Dict[str, Any]:
+        if self._in_payload or self._pending:
+            raise Exception("Truncated video data in response")
+        return json.loads(bytes(self.skeleton))
+
+    def _decode(self, part: bytes):
+        data = self._pending + part
+        # A trailing backslash may be the first half of an escape split across chunks
+        tail = b""
+        if data.endswith(b"\\"):
+            data, tail = data[:-1], b"\\"
+        data = data.replace(b"\\/", b"/")
+        usable = len(data) - len(data) % 4
+        if usable:
+            decoded = base64.b64decode(data[:usable])
+            self.out_file.write(decoded)
+            self.bytes_written += len(decoded)
+        self._pending = data[usable:] + tail
+
+    def _finish_payload(self):
+        if self._pending:
+            decoded = base64.b64decode(self._pending)
+            self.out_file.write(decoded)
+            self.bytes_written += len(decoded)
+            self._pending = b""
+        self._in_payload = False
 
 class VeoService:
     def __init__(self):
         self.api_key = GOOGLE_API_KEY
         if not self.api_key:
             raise ValueError("GOOGLE_API_KEY environment variable is required")
-        
+
         self.base_url = f"{VEO_BASE_URL}?key={self.api_key}"
-    
-    def generate_video(
+
+    async def generate_video(
         self,
         prompt: str,
+        output_path: str,
         duration: int = 5,
         aspect_ratio: str = "16:9",
         quality: str = "standard"
     ) -> Dict[str, Any]:
         """
-        Generate a video using Google's Veo 3 API.
+        Generate a video using Google's Veo 3 API and write it to output_path.
+        The response is parsed and base64-decoded as it streams in, so memory
+        use stays flat regardless of the video length.
         """
         request_data = {
             "contents": [
@@ -43,41 +126,56 @@ class VeoService:
                 "quality": quality
             }
         }
-        
+
+        part_path = output_path + ".part"
         try:
-            with httpx.Client(timeout=60.0) as client:
-                response = client.post(
+            with open(part_path, "wb") as f:
+                extractor = _InlineDataExtractor(f)
+                async with get_client("veo").stream(
+                    "POST",
                     self.base_url,
-                    json=request_data
-                )
-                response.raise_for_status()
-                result = response.json()
-                
-                if "error" in result:
-                    raise Exception(f"Veo API error: {result['error']}")
-                
-                if "candidates" not in result or not result["candidates"]:
-                    raise Exception("No video generated")
-                
-                video_data = result["candidates"][0]["content"]["parts"][0]
-                
-                if "inlineData" not in video_data:
-                    raise Exception("No video data in response")
-                
-                video_bytes = base64.b64decode(video_data["inlineData"]["data"])
-                
-                return {
-                    "status": "completed",
-                    "video_data": video_bytes,
-                    "mime_type": video_data["inlineData"]["mimeType"],
-                    "duration": duration,
-                    "aspect_ratio": aspect_ratio,
-                    "quality": quality
-                }
-                
+                    json=request_data,
+                    timeout=60.0
+                ) as response:
+                    if response.is_error:
+                        await response.aread()
+                    response.raise_for_status()
+                    async for chunk in response.aiter_bytes(VEO_CHUNK_SIZE):
+                        extractor.feed(chunk)
+
+            result = extractor.skeleton_json()
+
+            if "error" in result:
+                raise Exception(f"Veo API error: {result['error']}")
+
+            if "candidates" not in result or not result["candidates"]:
+                raise Exception("No video generated")
+
+            video_data = result["candidates"][0]["content"]["parts"][0]
+
+            if "inlineData" not in video_data or not extractor.bytes_written:
+                raise Exception("No video data in response")
+
+            os.replace(part_path, output_path)
+
+            return {
+                "status": "completed",
+                "video_path": output_path,
+                "size_bytes": extractor.bytes_written,
+                "mime_type": video_data["inlineData"]["mimeType"],
+                "duration": duration,
+                "aspect_ratio": aspect_ratio,
+                "quality": quality
+            }
+
+        except (binascii.Error, ValueError) as e:
+            raise Exception(f"Veo video generation failed: invalid response: {str(e)}")
         except Exception as e:
             raise Exception(f"Veo video generation failed: {str(e)}")
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
 
-def generate_veo_video(prompt: str, duration: int = 5, aspect_ratio: str = "16:9", quality: str = "standard") -> Dict[str, Any]:
+async def generate_veo_video(prompt: str, output_path: str, duration: int = 5, aspect_ratio: str = "16:9", quality: str = "standard") -> Dict[str, Any]:
     service = VeoService()
-    return service.generate_video(prompt, duration, aspect_ratio, quality) 
\ No newline at end of file
+    return await service.generate_video(prompt, output_path, duration, aspect_ratio, quality)
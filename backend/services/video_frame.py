@@ -1,10 +1,95 @@
 # backend/services/video_frame.py
+import os
 import cv2
+from typing import Dict, List, Optional
 
-def extract_first_frame(video_path: str, output_path: str) -> str:
+KEYFRAME_MAX_FRAMES = int(os.getenv("KEYFRAME_MAX_FRAMES", "4"))
+KEYFRAME_CANDIDATES = int(os.getenv("KEYFRAME_CANDIDATES", "16"))
+# Histogram correlation below this between neighbouring samples counts as a scene change
+KEYFRAME_SCENE_THRESHOLD = float(os.getenv("KEYFRAME_SCENE_THRESHOLD", "0.7"))
+KEYFRAME_MAX_SIDE = 640
+
+def _frame_stats(frame) -> Dict:
+    small = cv2.resize(frame, (160, int(160 * frame.shape[0] / frame.shape[1]) or 1))
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0, 1], None, [32, 32], [0, 180, 0, 256])
+    cv2.normalize(hist, hist)
+    return {
+        "brightness": float(gray.mean()),
+        "contrast": float(gray.std()),
+        "sharpness": float(cv2.Laplacian(gray, cv2.CV_64F).var()),
+        "hist": hist,
+    }
+
+def _encode(frame) -> Optional[bytes]:
+    height, width = frame.shape[:2]
+    scale = KEYFRAME_MAX_SIDE / max(height, width)
+    if scale < 1:
+        frame = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return buffer.tobytes() if ok else None
+
+def _first_frame(vidcap) -> List[Dict]:
+    success, frame = vidcap.read()
+    image = _encode(frame) if success else None
+    return [{"timestamp": 0.0, "image": image}] if image else []
+
+def extract_keyframes(
+    video_path: str,
+    max_frames: int = KEYFRAME_MAX_FRAMES,
+    candidates: int = KEYFRAME_CANDIDATES
+) -> List[Dict]:
+    """
+    Pick up to max_frames representative frames from a video in one forward pass.
+
+    Evenly spaced candidate frames are reached by seeking rather than decoding the
+    whole video. Near-black, near-white and flat frames (fades, logo cards) are
+    skipped, neighbouring candidates are grouped into scenes by colour-histogram
+    similarity, and the sharpest frame of each scene is kept. Returns a list of
+    {"timestamp", "image"} dicts in time order, where image is JPEG bytes;
+    frames that fail to encode are left out.
+    """
     vidcap = cv2.VideoCapture(video_path)
-    success, image = vidcap.read()
-    if success:
-        cv2.imwrite(output_path, image)
-        return output_path
-    return None
+    try:
+        frame_count = int(vidcap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = vidcap.get(cv2.CAP_PROP_FPS) or 25.0
+        if frame_count <= 0:
+            return _first_frame(vidcap)
+
+        step = max(1, frame_count // max(1, candidates))
+        scenes = []
+        previous_hist = None
+        for index in range(step // 2, frame_count, step):
+            vidcap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            success, frame = vidcap.read()
+            if not success:
+                break
+            stats = _frame_stats(frame)
+            if stats["brightness"] < 16 or stats["brightness"] > 240 or stats["contrast"] < 8:
+                continue
+
+            candidate = {"timestamp": round(index / fps, 2), "frame": frame, "sharpness": stats["sharpness"]}
+            is_new_scene = previous_hist is None or cv2.compareHist(
+                previous_hist, stats["hist"], cv2.HISTCMP_CORREL
+            ) < KEYFRAME_SCENE_THRESHOLD
+            previous_hist = stats["hist"]
+            if is_new_scene:
+                scenes.append(candidate)
+            elif candidate["sharpness"] > scenes[-1]["sharpness"]:
+                scenes[-1] = candidate
+
+        if not scenes:
+            vidcap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            return _first_frame(vidcap)
+
+        picked = sorted(scenes, key=lambda c: c["sharpness"], reverse=True)[:max_frames]
+        picked.sort(key=lambda c: c["timestamp"])
+        keyframes = []
+        for candidate in picked:
+            image = _encode(candidate["frame"])
+            if image:
+                keyframes.append({"timestamp": candidate["timestamp"], "image": image})
+        return keyframes
+    finally:
+        vidcap.release()
@@ -0,0 +1,133 @@
+"""
+Compare captioning backends on a fixed set of images.
+
+    cd backend
+    python -m tools.benchmark_captioning path/to/images --backends torch,int8,onnx
+
+Each backend runs in its own process so load time and peak memory are measured
+in isolation. Reports single-image latency, batched throughput, peak RSS and how
+often each backend's captions agree with the fp32 torch baseline (the output of
+get_image_caption).
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from services import image_caption
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+
+def _load_images(image_dir: str) -> list:
+    paths = sorted(
+        path for path in glob.glob(os.path.join(image_dir, "*"))
+        if path.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    images = []
+    for path in paths:
+        with open(path, "rb") as f:
+            images.append((os.path.basename(path), f.read()))
+    return images
+
+
+def _run_backend(backend: str, images: list, batch_size: int, repeat: int, threads: int) -> dict:
+    import torch
+    torch.set_num_threads(threads)
+
+    started = time.perf_counter()
+    image_caption.load_model(backend)
+    load_seconds = time.perf_counter() - started
+
+    data = [image for _, image in images]
+    # Warm-up pass so one-off allocations do not skew the first latency sample
+    image_caption.caption_images(data[:1], backend)
+
+    latencies = []
+    captions = []
+    for image in data:
+        started = time.perf_counter()
+        captions.append(image_caption.caption_images([image], backend)[0])
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for i in range(0, len(data), batch_size):
+            image_caption.caption_images(data[i:i + batch_size], backend)
+    batch_seconds = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "backend": backend,
+        "load_seconds": load_seconds,
+        "latency_p50_ms": statistics.median(latencies) * 1000,
+        "latency_p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+        "throughput_images_per_second": len(data) * repeat / batch_seconds,
+        # ru_maxrss is KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "captions": captions,
+    }
+
+
+def _token_overlap(a: str, b: str) -> float:
+    tokens_a, tokens_b = set(a.lower().split()), set(b.lower().split())
+    if not tokens_a and not tokens_b:
+        return 1.0
+    return len(tokens_a & tokens_b) / len(tokens_a | tokens_b)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("image_dir", help="Directory with the fixed benchmark images")
+    parser.add_argument("--backends", default=",".join(image_caption.CAPTION_BACKENDS))
+    parser.add_argument("--batch-size", type=int, default=image_caption.CAPTION_MAX_BATCH)
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the image set for the throughput run")
+    parser.add_argument("--threads", type=int, default=image_caption.CAPTION_TORCH_THREADS)
+    args = parser.parse_args()
+
+    images = _load_images(args.image_dir)
+    if not images:
+        sys.exit(f"No images found in {args.image_dir}")
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    if "torch" not in backends:
+        backends.insert(0, "torch")
+
+    results = {}
+    for backend in backends:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results[backend] = pool.submit(
+                _run_backend, backend, images, args.batch_size, args.repeat, args.threads
+            ).result()
+
+    baseline = results["torch"]["captions"]
+    print(f"{len(images)} images, batch size {args.batch_size}, {args.threads} threads\n")
+    print(f"{'backend':<10} {'load s':>7} {'p50 ms':>8} {'p95 ms':>8} {'img/s':>7} {'RSS MB':>8} {'exact':>6} {'overlap':>8}")
+    for backend, result in results.items():
+        pairs = list(zip(baseline, result["captions"]))
+        exact = sum(a == b for a, b in pairs) / len(pairs)
+        overlap = statistics.mean(_token_overlap(a, b) for a, b in pairs)
+        print(
+            f"{backend:<10} {result['load_seconds']:>7.1f} {result['latency_p50_ms']:>8.1f} "
+            f"{result['latency_p95_ms']:>8.1f} {result['throughput_images_per_second']:>7.2f} "
+            f"{result['peak_rss_mb']:>8.0f} {exact:>6.0%} {overlap:>8.2f}"
+        )
+
+    disagreements = [
+        (name, baseline[i], result["captions"][i], backend)
+        for backend, result in results.items() if backend != "torch"
+        for i, (name, _) in enumerate(images) if result["captions"][i] != baseline[i]
+    ]
+    if disagreements:
+        print("\nCaptions that differ from torch:")
+        for name, expected, actual, backend in disagreements:
+            print(f"  [{backend}] {name}: {expected!r} -> {actual!r}")
+
+
+if __name__ == "__main__":
+    main()
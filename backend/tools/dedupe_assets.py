@@ -0,0 +1,66 @@
+"""
+Move existing session assets into the blob store and remove unreferenced blobs.
+
+    cd backend
+    python -m tools.dedupe_assets --dry-run
+    python -m tools.dedupe_assets
+
+Assets registered before the blob store existed (or migrated with
+tools.migrate_uploads) have no content hash or are not yet linked to their blob;
+they are hashed, linked, and their rows updated. Blobs that no asset row references any more are
+then deleted, so run this after removing sessions to reclaim space.
+"""
+import argparse
+import os
+
+from services.blob_store import BlobStore, file_sha256
+from services.session_store import UPLOAD_DIR, SessionStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--upload-dir", default=UPLOAD_DIR)
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Asset rows per index transaction")
+    args = parser.parse_args()
+
+    store = SessionStore(os.path.join(args.upload_dir, "sessions.db"), args.upload_dir)
+    blobs = BlobStore(os.path.join(args.upload_dir, "blobs"))
+
+    adopted = 0
+    missing = 0
+    for asset in store.get_all_assets():
+        path = asset["path"]
+        if not os.path.isfile(path):
+            missing += 1
+            continue
+        blob = blobs.blob_path(asset["sha256"]) if asset["sha256"] else None
+        if blob and os.path.exists(blob) and os.path.samefile(blob, path):
+            continue
+        if args.dry_run:
+            print(f"would adopt {path}")
+            continue
+        # Hash from disk rather than trusting the row: the file may have been rewritten
+        sha256 = blobs.adopt(path, file_sha256(path))
+        if sha256 != asset["sha256"]:
+            store.add_asset(
+                asset["session_id"], asset["kind"], path,
+                original_name=asset["original_name"], sha256=sha256, commit=False
+            )
+        adopted += 1
+        if adopted % args.batch_size == 0:
+            store.commit()
+            print(f"{adopted} assets adopted")
+    store.commit()
+
+    gc = blobs.collect_garbage(store.referenced_hashes(), dry_run=args.dry_run)
+    print(
+        f"{adopted} assets adopted ({blobs.deduplicated} duplicates, {blobs.bytes_saved} bytes saved), "
+        f"{missing} asset files missing"
+    )
+    action = "would remove" if args.dry_run else "removed"
+    print(f"{action} {gc['removed']} unreferenced blobs ({gc['freed_bytes']} bytes), kept {gc['kept']}")
+
+
+if __name__ == "__main__":
+    main()
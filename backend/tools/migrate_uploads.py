@@ -0,0 +1,88 @@
+"""
+Move the flat uploads/ layout ({session_id}_{name} files) into per-session
+directories and register everything in the session index.
+
+    cd backend
+    python -m tools.migrate_uploads --dry-run
+    python -m tools.migrate_uploads
+
+Safe to re-run: files already moved are no longer in the flat directory, and
+registering an asset twice updates the existing row.
+"""
+import argparse
+import json
+import os
+import re
+
+from services.session_store import UPLOAD_DIR, SessionStore
+
+FLAT_NAME = re.compile(r"^([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})_(.+)$")
+GENERATED_KINDS = {
+    "veo_background.mp4": "veo_background",
+    "heygen_overlay.mp4": "heygen_overlay",
+    "combined_final.mp4": "combined_final",
+    "frame.jpg": "frame",
+}
+
+
+def classify(name: str):
+    """Return (kind, original upload name) for a flat file name without its session prefix."""
+    if name in GENERATED_KINDS:
+        return GENERATED_KINDS[name], None
+    match = re.match(r"^image_\d+_(.+)$", name) or re.match(r"^image_(.+)$", name)
+    if match:
+        return "image", match.group(1)
+    for kind in ("video", "voice"):
+        if name.startswith(f"{kind}_"):
+            return kind, name[len(kind) + 1:]
+    return "other", None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--upload-dir", default=UPLOAD_DIR)
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be migrated")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Entries per index transaction")
+    args = parser.parse_args()
+
+    store = SessionStore(os.path.join(args.upload_dir, "sessions.db"), args.upload_dir)
+    sessions = set()
+    migrated = 0
+    skipped = 0
+
+    with os.scandir(args.upload_dir) as entries:
+        for entry in entries:
+            match = FLAT_NAME.match(entry.name)
+            if not match or not entry.is_file():
+                skipped += 1
+                continue
+            session_id, name = match.groups()
+            sessions.add(session_id)
+
+            if name == "product.json":
+                if not args.dry_run:
+                    with open(entry.path, "r") as f:
+                        store.create_session(session_id, json.load(f), commit=False)
+                    os.replace(entry.path, store.asset_path(session_id, name))
+            else:
+                kind, original_name = classify(name)
+                if args.dry_run:
+                    print(f"{entry.name} -> sessions/{session_id[:2]}/{session_id}/{name} ({kind})")
+                else:
+                    new_path = store.asset_path(session_id, name)
+                    os.replace(entry.path, new_path)
+                    store.add_asset(session_id, kind, new_path, original_name=original_name, commit=False)
+
+            migrated += 1
+            if not args.dry_run and migrated % args.batch_size == 0:
+                store.commit()
+                print(f"{migrated} files migrated")
+
+    if not args.dry_run:
+        store.commit()
+    action = "would migrate" if args.dry_run else "migrated"
+    print(f"{action} {migrated} files in {len(sessions)} sessions; {skipped} entries left in place")
+
+
+if __name__ == "__main__":
+    main()
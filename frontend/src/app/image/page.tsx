@@ -321,12 +321,12 @@ Script: ${scriptResult.script}`;
               {optimizedImageResult && (
                 <div className="flex flex-col items-center mb-6">
                   <img 
-                    src={optimizedImageResult.image_data} 
+                    src={`http://localhost:8000${optimizedImageResult.image_url}`} 
                     alt="AI Generated" 
                     className="rounded-lg shadow-lg max-w-full max-h-96" 
                   />
                   <a
-                    href={optimizedImageResult.image_data}
+                    href={`http://localhost:8000${optimizedImageResult.image_url}`}
                     download="ai-generated-image.png"
                     className="mt-3 text-blue-600 underline text-sm font-medium"
                   >
@@ -210,12 +210,12 @@ export default function WorkflowSummary() {
               </div>
               <div className="flex flex-col items-center">
                 <img 
-                  src={imageResult.image_data} 
+                  src={`http://localhost:8000${imageResult.thumbnail_url}`} 
                   alt="AI Generated" 
                   className="rounded-lg shadow-lg max-w-full max-h-48" 
                 />
                 <a
-                  href={imageResult.image_data}
+                  href={`http://localhost:8000${imageResult.image_url}`}
                   download="ai-generated-image.png"
                   className="mt-2 text-orange-600 underline text-sm"
                 >